@@ -0,0 +1,159 @@
+#! /usr/bin/env python3
+"""
+Host-side benchmark of the framebuffer transfer in lib/epaper1in54.EPD.
+
+Counts spi.write() calls, bytes sent and CS frames for a full-screen transfer,
+comparing the previous one-byte-per-frame implementation with the current one.
+
+Usage: python scripts/bench_epd.py
+"""
+
+import time
+
+import micropython_host
+
+micropython_host.install()
+
+from lib.epaper1in54 import EPD, EPD_WIDTH, EPD_HEIGHT  # noqa: E402
+
+
+class CountingSPI:
+    def __init__(self):
+        self.calls = 0
+        self.bytes = 0
+
+    def write(self, data):
+        self.calls += 1
+        self.bytes += len(data)
+
+
+class CountingPin:
+    def __init__(self, value=1):
+        self._value = value
+        self.falls = 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        if self._value:
+            self.falls += 1
+        self._value = 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self.on() if v else self.off()
+
+
+def legacy_write_buffer_to_ram(epd: EPD, buffer, mirror_y=False):
+    """The pre-bulk implementation: one CS frame and allocation per byte"""
+    width_bytes = EPD_WIDTH // 8
+    for i in range(EPD_HEIGHT):
+        for j in range(width_bytes):
+            idx = (
+                j + (EPD_HEIGHT - 1 - i) * width_bytes
+                if mirror_y
+                else j + i * width_bytes
+            )
+            epd.send_data(bytearray([buffer[idx]]))
+
+
+def legacy_init(epd: EPD):
+    """The pre-table init() and hw_init(): one CS frame per command and data"""
+
+    def frame(dc, data):
+        epd.dc.value(dc)
+        epd.cs.off()
+        epd.spi.write(bytearray(data))
+        epd.cs.on()
+
+    epd.reset()
+    for command, data in (
+        (0x01, (0x00,)),
+        (None, (0xC7,)),
+        (None, (0x00,)),
+        (0x0C, (0xD7, 0xD6, 0x9D)),
+        (0x2C, (0xA8,)),
+        (0x3A, (0x1A,)),
+        (0x3B, (0x08,)),
+        (0x11, (0x03,)),
+        (0x32, EPD.LUT_FULL_UPDATE),
+    ):
+        if command is not None:
+            frame(0, (command,))
+        frame(1, data)
+    # hw_init() sent every byte as a command
+    for command in (
+        0x12, 0x01, 0xC7, 0x00, 0x00, 0x11, 0x01, 0x44, 0x00, 0x18, 0x45, 0xC7,
+        0x00, 0x00, 0x00, 0x3C, 0x05, 0x18, 0x80, 0x4E, 0x00, 0x4F, 0x00,
+    ):  # fmt: skip
+        frame(0, (command,))
+
+
+def make_epd(hw_mirror_y=True):
+    spi = CountingSPI()
+    cs = CountingPin()
+    epd = EPD(
+        spi=spi,
+        cs=cs,
+        dc=CountingPin(0),
+        rst=CountingPin(),
+        busy=CountingPin(0),
+        hw_mirror_y=hw_mirror_y,
+    )
+    return epd, spi, cs
+
+
+def run(name, transfer, repeat=20, hw_mirror_y=True):
+    epd, spi, cs = make_epd(hw_mirror_y)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        transfer(epd)
+    elapsed_ms = (time.perf_counter() - start) * 1000 / repeat
+    print(
+        "{:<30} {:>8} {:>8} {:>8} {:>10.3f}".format(
+            name,
+            spi.calls // repeat,
+            spi.bytes // repeat,
+            cs.falls // repeat,
+            elapsed_ms,
+        )
+    )
+
+
+def main():
+    buffer = bytearray(i & 0xFF for i in range(EPD_WIDTH * EPD_HEIGHT // 8))
+    print(
+        "{:<30} {:>8} {:>8} {:>8} {:>10}".format(
+            "transfer", "writes", "bytes", "cs", "host ms"
+        )
+    )
+    for mirror_y in (False, True):
+        suffix = " (mirror_y)" if mirror_y else ""
+        run(
+            "legacy" + suffix,
+            lambda epd: legacy_write_buffer_to_ram(epd, buffer, mirror_y=mirror_y),
+        )
+        run(
+            "bulk" + suffix,
+            lambda epd: epd.write_buffer_to_ram(buffer, mirror_y=mirror_y),
+        )
+    # whole frame including window setup and refresh commands
+    for hw_mirror_y in (False, True):
+        run(
+            "display_buffer (hw_mirror_y)" if hw_mirror_y else "display_buffer",
+            lambda epd: epd.display_buffer(buffer),
+            hw_mirror_y=hw_mirror_y,
+        )
+    run("legacy init", legacy_init)
+    run("init", lambda epd: epd.init())
+    # partial refresh of two 38px text lines of the prose watchface
+    run(
+        "display_window (10, 80, 190, 76)",
+        lambda epd: epd.display_window(buffer, 10, 80, 190, 76),
+    )
+
+
+if __name__ == "__main__":
+    main()
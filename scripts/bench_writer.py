@@ -0,0 +1,147 @@
+#! /usr/bin/env python3
+"""
+Benchmark of glyph rendering in lib/writer.Writer.
+
+Compares glyphs per second when a glyph starts on a byte boundary of the
+Display buffer, and is copied into it row by row, with an unaligned one that
+goes through a glyph FrameBuffer and blit(), for each watchface font. Also
+checks that both paths draw the same pixels. Then compares a line drawn by
+printstring() with the same line drawn by render_run(), also on a device
+that skips the drawing to show the overhead per glyph alone.
+
+On the host framebuf is emulated in Python, which exaggerates the cost of
+blit(). The script runs unchanged on the watch for real figures:
+
+Usage: python scripts/bench_writer.py
+       mpremote run scripts/bench_writer.py  # with src/ on the device
+"""
+
+import sys
+import time
+
+if sys.implementation.name != "micropython":
+    import micropython_host
+
+    micropython_host.install()
+
+import framebuf  # noqa: E402
+from lib.writer import Writer  # noqa: E402
+from assets.fonts import (  # noqa: E402
+    fira_sans_bold_58,
+    fira_sans_regular_28,
+    fira_sans_regular_38,
+)
+
+WIDTH = 200
+HEIGHT = 200
+TEXT = "Wed, 12 Sep twenty o'clock"
+LINE = "Wed, 12 Sep"  # fits the screen in every font
+
+
+def ticks_us():
+    if hasattr(time, "ticks_us"):
+        return time.ticks_us()
+    return int(time.perf_counter() * 1000000)
+
+
+class NullDevice(framebuf.FrameBuffer):
+    def blit(self, *args):
+        pass
+
+
+def make_writer(font, aligned_copy=True, device_class=framebuf.FrameBuffer):
+    buffer = bytearray(WIDTH * HEIGHT // 8)
+    device = device_class(buffer, WIDTH, HEIGHT, framebuf.MONO_HLSB)
+    device.fill(1)
+    wri = Writer(
+        device,
+        font,
+        WIDTH,
+        HEIGHT,
+        verbose=False,
+        buffer=buffer if aligned_copy else None,
+    )
+    wri.set_clip(True, True, False)
+    return wri, device, buffer
+
+
+def run(name, font, draw, glyphs, repeat, device_class=framebuf.FrameBuffer):
+    """Times draw(writer, device), which draws `glyphs` glyphs"""
+    wri, device, _ = make_writer(font, device_class=device_class)
+    start = ticks_us()
+    for _ in range(repeat):
+        draw(wri, device)
+    elapsed_us = ticks_us() - start
+    glyphs *= repeat
+    print(
+        "{:<30} {:>10.0f} {:>10.1f}".format(
+            name, glyphs * 1000000 / elapsed_us, elapsed_us / glyphs
+        )
+    )
+
+
+def same_pixels(font) -> bool:
+    """
+    Compares each glyph of TEXT drawn with and without the row copy, at
+    column 8 and clipped at the right edge
+    """
+    aligned = make_writer(font)
+    blitted = make_writer(font, aligned_copy=False)
+    for col in (8, WIDTH - 8):
+        for char in TEXT:
+            for wri, device, _ in (aligned, blitted):
+                device.fill(1)
+                wri.set_textpos(device, 10, col)
+                wri.printstring(char)
+            if aligned[2] != blitted[2]:
+                return False
+    return True
+
+
+def glyph_by_glyph(col):
+    def draw(wri, device):
+        for char in TEXT:
+            wri.set_textpos(device, 10, col)
+            wri.printstring(char)
+
+    return draw
+
+
+def printstring(wri, device):
+    wri.set_textpos(device, 10, 8)
+    wri.printstring(LINE)
+
+
+def render_run(wri, device):
+    wri.render_run(LINE, 8, 10)
+
+
+def main():
+    repeat = 20 if sys.implementation.name == "micropython" else 2
+    print("{:<30} {:>10} {:>10}".format("glyphs", "per s", "us each"))
+    for name, font in (
+        ("regular 28", fira_sans_regular_28),
+        ("regular 38", fira_sans_regular_38),
+        ("bold 58", fira_sans_bold_58),
+    ):
+        run(name + " aligned (x=8)", font, glyph_by_glyph(8), len(TEXT), repeat)
+        run(name + " unaligned (x=9)", font, glyph_by_glyph(9), len(TEXT), repeat)
+        if not same_pixels(font):
+            print(name + ": aligned copy and blit differ")
+    for device_class, suffix in (
+        (framebuf.FrameBuffer, ""),
+        (NullDevice, " (no blit)"),
+    ):
+        for name, draw in (("printstring", printstring), ("render_run", render_run)):
+            run(
+                "line " + name + suffix,
+                fira_sans_regular_28,
+                draw,
+                len(LINE),
+                repeat * 10,
+                device_class,
+            )
+
+
+if __name__ == "__main__":
+    main()
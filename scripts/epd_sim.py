@@ -0,0 +1,475 @@
+#! /usr/bin/env python3
+"""
+Host-side simulator of the e-paper controller behind lib/epaper1in54.EPD.
+
+Fake SPI and Pin objects feed the command and data stream into a model of
+the SSD1681 (GDEH0154D67) / IL3829 (GDEH0154D27) controller: RAM windows,
+address counters, data entry mode, LUT upload, deep sleep and BUSY timing.
+Every CS frame, spi.write() and byte is counted, the time on a Watchy is
+estimated on a virtual clock and the image on the glass can be saved as
+PBM or PNG.
+
+    sim = Simulator()
+    epd = sim.epd()
+    with sim.measure("init"):
+        epd.init()
+    sim.save("panel.png")
+    print(sim.report())
+
+Usage: python scripts/epd_sim.py [image.png|image.pbm]
+"""
+
+import asyncio
+import struct
+import sys
+import zlib
+
+import micropython_host
+
+micropython_host.install()
+
+import lib.epaper1in54 as epaper1in54  # noqa: E402
+from lib.epaper1in54 import EPD, EPD_HEIGHT, EPD_WIDTH, GDEH0154D67  # noqa: E402
+
+WIDTH_BYTES = EPD_WIDTH // 8
+
+# Estimates for an ESP32 running MicroPython and a GDEH0154D67 at room
+# temperature, good enough to compare transfers with each other.
+SPI_BAUDRATE = 20000000
+WRITE_OVERHEAD_US = 15  # one spi.write() call from MicroPython
+PIN_OVERHEAD_US = 3  # one Pin.on()/off() call
+SW_RESET_MS = 10
+HW_RESET_BUSY_MS = 1
+LOAD_TEMPERATURE_MS = 20
+LOAD_LUT_MS = 40
+FULL_REFRESH_MS = 2000
+PARTIAL_REFRESH_MS = 400
+
+# DISPLAY_UPDATE_CONTROL_2 bits
+LOAD_TEMPERATURE = 0x20
+LOAD_LUT = 0x10
+DISPLAY_MODE_2 = 0x08
+DISPLAY = 0x04
+
+
+class Stats:
+    def __init__(self, name=""):
+        self.name = name
+        self.frames = 0  # CS frames
+        self.writes = 0  # spi.write() calls
+        self.bytes = 0
+        self.commands = 0
+        self.refreshes = 0
+        self.us = 0  # estimated time on the Watchy
+
+    def counters(self):
+        return (
+            self.frames,
+            self.writes,
+            self.bytes,
+            self.commands,
+            self.refreshes,
+            self.us,
+        )
+
+    def since(self, start: "Stats", name: str) -> "Stats":
+        stats = Stats(name)
+        (
+            stats.frames,
+            stats.writes,
+            stats.bytes,
+            stats.commands,
+            stats.refreshes,
+            stats.us,
+        ) = (a - b for a, b in zip(self.counters(), start.counters()))
+        return stats
+
+    def copy(self) -> "Stats":
+        return self.since(Stats(), self.name)
+
+
+class Measurement:
+    def __init__(self, sim: "Simulator", name: str):
+        self.sim = sim
+        self.name = name
+        self.stats = None
+
+    def __enter__(self):
+        self._start = self.sim.stats.copy()
+        return self
+
+    def __exit__(self, *exc):
+        self.stats = self.sim.stats.since(self._start, self.name)
+        self.sim.measurements.append(self.stats)
+
+
+class SimPin:
+    IN = 1
+    OUT = 3
+    IRQ_FALLING = 2
+    IRQ_RISING = 1
+
+    def __init__(self, sim: "Simulator", name: str, value=1):
+        self.sim = sim
+        self.name = name
+        self._value = value
+        self._handler = None
+        self._trigger = 0
+
+    def value(self, v=None):
+        if v is None:
+            if self is self.sim.busy:
+                return 1 if self.sim.is_busy() else 0
+            return self._value
+        self.on() if v else self.off()
+
+    def on(self):
+        self.sim.advance_us(PIN_OVERHEAD_US)
+        previous, self._value = self._value, 1
+        if not previous:
+            self.sim.pin_rose(self)
+
+    def off(self):
+        self.sim.advance_us(PIN_OVERHEAD_US)
+        previous, self._value = self._value, 0
+        if previous:
+            self.sim.pin_fell(self)
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self._handler = handler
+        self._trigger = trigger
+
+    def _busy_fell(self):
+        if self._handler is not None and self._trigger & self.IRQ_FALLING:
+            self._handler(self)
+
+
+class SimSPI:
+    def __init__(self, sim: "Simulator"):
+        self.sim = sim
+
+    def write(self, data):
+        self.sim.spi_write(bytes(data))
+
+
+class Simulator:
+    """
+    The controller model. Only one simulator drives lib.epaper1in54 at a
+    time, as its sleep_ms() and ticks_ms() are redirected to the virtual
+    clock.
+    """
+
+    def __init__(self, panel: str = GDEH0154D67):
+        self.panel = panel
+        self.cs = SimPin(self, "cs", 1)
+        self.dc = SimPin(self, "dc", 0)
+        self.rst = SimPin(self, "rst", 1)
+        self.busy = SimPin(self, "busy", 0)
+        self.spi = SimSPI(self)
+        self.stats = Stats()
+        self.measurements: list[Stats] = []
+        self.now_us = 0
+        self.ram = bytearray(b"\xFF" * (WIDTH_BYTES * EPD_HEIGHT))  # new image
+        self.ram_red = bytearray(self.ram)  # old image
+        self.glass = bytearray(self.ram)  # what the panel shows
+        self.lut = b""  # uploaded with WRITE_LUT_REGISTER
+        self.lut_loaded = None  # display mode whose OTP LUT is loaded
+        self.asleep = 0  # DEEP_SLEEP_MODE parameter
+        self._busy_until = 0
+        self._command: int | None = None
+        self._params = bytearray()
+        self._ram = self.ram  # selected by WRITE_RAM or WRITE_RAM_RED
+        self._reset_registers()
+
+    def _reset_registers(self):
+        self.entry_mode = 0x03  # X increment, Y increment
+        self.x_start, self.x_end = 0, WIDTH_BYTES - 1
+        self.y_start, self.y_end = 0, EPD_HEIGHT - 1
+        self.x, self.y = 0, 0
+        self.update_control = 0xFF
+        self.lut_loaded = None
+
+    def epd(self, **kwargs) -> EPD:
+        """
+        :return: an EPD wired to this simulator, kwargs go to EPD()
+        """
+        epaper1in54.sleep_ms = self.sleep_ms
+        epaper1in54.ticks_ms = self.ticks_ms
+        epaper1in54.asyncio = _SimAsyncio(self)
+        kwargs.setdefault("panel", self.panel)
+        return EPD(
+            spi=self.spi,
+            cs=self.cs,
+            dc=self.dc,
+            rst=self.rst,
+            busy=self.busy,
+            **kwargs,
+        )
+
+    def measure(self, name: str) -> Measurement:
+        """
+        Context manager that records the counters of what runs inside it
+        """
+        return Measurement(self, name)
+
+    # virtual clock
+
+    def advance_us(self, us: int):
+        busy = self.is_busy()
+        self.now_us += us
+        self.stats.us += us
+        if busy and not self.is_busy():
+            self.busy._busy_fell()
+
+    def sleep_ms(self, ms: int):
+        self.advance_us(ms * 1000)
+
+    def ticks_ms(self) -> int:
+        return self.now_us // 1000
+
+    def is_busy(self) -> bool:
+        return bool(self.asleep) or self.now_us < self._busy_until
+
+    def _busy_for(self, ms: int):
+        self._busy_until = max(self._busy_until, self.now_us) + ms * 1000
+
+    # wire level
+
+    def pin_fell(self, pin: SimPin):
+        if pin is self.cs:
+            self.stats.frames += 1
+        elif pin is self.rst:
+            self._hardware_reset()
+
+    def pin_rose(self, pin: SimPin):
+        if pin is self.cs:
+            self._end_command()
+
+    def spi_write(self, data: bytes):
+        self.stats.writes += 1
+        self.stats.bytes += len(data)
+        self.advance_us(WRITE_OVERHEAD_US + len(data) * 8 * 1000000 // SPI_BAUDRATE)
+        if self.cs._value or self.asleep:
+            return  # not selected, or not listening
+        if self.dc._value:
+            for byte in data:
+                self._data(byte)
+        else:
+            for byte in data:
+                self._end_command()
+                self._start_command(byte)
+
+    def _hardware_reset(self):
+        if self.asleep == epaper1in54.DEEP_SLEEP_2:
+            self.ram[:] = bytes(len(self.ram))
+            self.ram_red[:] = bytes(len(self.ram_red))
+        self.asleep = 0
+        self._command = None
+        self._reset_registers()
+        self._busy_until = self.now_us
+        self._busy_for(HW_RESET_BUSY_MS)
+
+    # commands
+
+    def _start_command(self, command: int):
+        self.stats.commands += 1
+        self._command = command
+        self._params = bytearray()
+        if command == epaper1in54.SW_RESET:
+            self._reset_registers()
+            self._busy_for(SW_RESET_MS)
+        elif command == epaper1in54.MASTER_ACTIVATION:
+            self._activate()
+        elif command == epaper1in54.WRITE_RAM_RED:
+            self._ram = self.ram_red
+        elif command == epaper1in54.WRITE_RAM:
+            self._ram = self.ram
+
+    def _data(self, byte: int):
+        command = self._command
+        if command in (epaper1in54.WRITE_RAM, epaper1in54.WRITE_RAM_RED):
+            self._write_ram(byte)
+        elif command is not None:
+            self._params.append(byte)
+
+    def _end_command(self):
+        """Applies the parameters collected for the current command"""
+        command, p = self._command, self._params
+        if command is None or not p:
+            return
+        if command == epaper1in54.DATA_ENTRY_MODE_SETTING:
+            self.entry_mode = p[0] & 0x07
+        elif command == epaper1in54.SET_RAM_X_ADDRESS_START_END_POSITION:
+            self.x_start = p[0] & 0x3F
+            if len(p) > 1:
+                self.x_end = p[1] & 0x3F
+        elif command == epaper1in54.SET_RAM_Y_ADDRESS_START_END_POSITION:
+            if len(p) >= 2:
+                self.y_start = p[0] | (p[1] & 0x01) << 8
+            if len(p) >= 4:
+                self.y_end = p[2] | (p[3] & 0x01) << 8
+        elif command == epaper1in54.SET_RAM_X_ADDRESS_COUNTER:
+            self.x = p[0] & 0x3F
+        elif command == epaper1in54.SET_RAM_Y_ADDRESS_COUNTER:
+            self.y = p[0] | (p[1] & 0x01) << 8 if len(p) > 1 else p[0]
+        elif command == epaper1in54.DISPLAY_UPDATE_CONTROL_2:
+            self.update_control = p[0]
+        elif command == epaper1in54.WRITE_LUT_REGISTER:
+            self.lut = bytes(p)
+        elif command == epaper1in54.DEEP_SLEEP_MODE:
+            self.asleep = p[0] & 0x03
+        self._params = bytearray()
+
+    def _write_ram(self, byte: int):
+        if 0 <= self.x < WIDTH_BYTES and 0 <= self.y < EPD_HEIGHT:
+            self._ram[self.y * WIDTH_BYTES + self.x] = byte
+        x_step = 1 if self.entry_mode & 0x01 else -1
+        y_step = 1 if self.entry_mode & 0x02 else -1
+        if self.entry_mode & 0x04:  # Y first
+            if self.y == self.y_end:
+                self.y = self.y_start
+                self.x += x_step
+            else:
+                self.y += y_step
+        elif self.x == self.x_end:
+            self.x = self.x_start
+            self.y += y_step
+        else:
+            self.x += x_step
+
+    def _activate(self):
+        control = self.update_control
+        if self.panel != GDEH0154D67:
+            # IL3829: the refresh runs the LUT uploaded to RAM
+            partial = self.lut == bytes(EPD.LUT_PARTIAL_UPDATE)
+            control = DISPLAY | (DISPLAY_MODE_2 if partial else 0)
+        ms = 0
+        if control & LOAD_TEMPERATURE:
+            ms += LOAD_TEMPERATURE_MS
+        if control & LOAD_LUT:
+            ms += LOAD_LUT_MS
+            self.lut_loaded = bool(control & DISPLAY_MODE_2)
+        if control & DISPLAY:
+            self.stats.refreshes += 1
+            self.glass[:] = self.ram
+            ms += PARTIAL_REFRESH_MS if control & DISPLAY_MODE_2 else FULL_REFRESH_MS
+        self._busy_for(ms)
+
+    # output
+
+    def image(self, mirror_y=True) -> bytes:
+        """
+        :return: the glass as a MONO_HLSB framebuffer, 1 for white. With
+        mirror_y, rows are in the framebuffer order Display sends them in.
+        """
+        if not mirror_y:
+            return bytes(self.glass)
+        return b"".join(
+            self.glass[row * WIDTH_BYTES : (row + 1) * WIDTH_BYTES]
+            for row in range(EPD_HEIGHT - 1, -1, -1)
+        )
+
+    def save(self, path: str, mirror_y=True):
+        """
+        Saves the glass as a PBM, or as a PNG if the path ends in .png
+        """
+        pixels = self.image(mirror_y)
+        if path.lower().endswith(".png"):
+            data = _png(pixels)
+        else:
+            # PBM uses 1 for black
+            data = b"P4\n%d %d\n" % (EPD_WIDTH, EPD_HEIGHT) + bytes(
+                0xFF ^ b for b in pixels
+            )
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def report(self) -> str:
+        row = "{:<32} {:>7} {:>7} {:>8} {:>8} {:>9} {:>10}"
+        lines = [
+            row.format(
+                "operation",
+                "frames",
+                "writes",
+                "bytes",
+                "commands",
+                "refreshes",
+                "est. ms",
+            )
+        ]
+        for s in self.measurements:
+            lines.append(
+                row.format(
+                    s.name,
+                    s.frames,
+                    s.writes,
+                    s.bytes,
+                    s.commands,
+                    s.refreshes,
+                    "{:.1f}".format(s.us / 1000),
+                )
+            )
+        return "\n".join(lines)
+
+
+class _SimAsyncio:
+    """uasyncio for lib.epaper1in54, sleeping on the virtual clock"""
+
+    def __init__(self, sim: Simulator):
+        self.sim = sim
+
+    async def sleep_ms(self, ms: int):
+        self.sim.sleep_ms(ms)
+        await asyncio.sleep(0)
+
+
+def _png(pixels: bytes) -> bytes:
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    raw = b"".join(
+        b"\x00" + pixels[row * WIDTH_BYTES : (row + 1) * WIDTH_BYTES]
+        for row in range(EPD_HEIGHT)
+    )
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + chunk(b"IHDR", struct.pack(">IIBBBBB", EPD_WIDTH, EPD_HEIGHT, 1, 0, 0, 0, 0))
+        + chunk(b"IDAT", zlib.compress(raw))
+        + chunk(b"IEND", b"")
+    )
+
+
+def test_frame(offset: int = 0) -> bytearray:
+    """A white frame with black stripes, framebuffer order"""
+    frame = bytearray(b"\xFF" * (WIDTH_BYTES * EPD_HEIGHT))
+    for row in range(20 + offset, 60 + offset):
+        for column in range(2, WIDTH_BYTES - 2, 2):
+            frame[row * WIDTH_BYTES + column] = 0x00
+    return frame
+
+
+def main():
+    sim = Simulator()
+    epd = sim.epd()
+    first, second = test_frame(), test_frame(offset=100)
+    with sim.measure("init"):
+        epd.init()
+    with sim.measure("display_buffer (full)"):
+        epd.display_buffer(first)
+    with sim.measure("display_window (partial)"):
+        epd.display_window(second, 0, 120, EPD_WIDTH, 40)
+    with sim.measure("sleep"):
+        epd.sleep()
+    with sim.measure("wake"):
+        epd.wake()
+    print(sim.report())
+    if len(sys.argv) > 1:
+        sim.save(sys.argv[1])
+
+
+if __name__ == "__main__":
+    main()
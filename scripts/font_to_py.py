@@ -384,22 +384,109 @@ class Font(dict):
             outbuffer.bitblt(glyph.bitmap, row, left)
             self[char] = [outbuffer, width, char_width]
 
-    def stream_char(self, char, hmap, reverse):
+    # Per-glyph metrics in pixels: advance, ink width, left bearing (first
+    # lit column), top and bottom (exclusive) lit rows. All zero for a blank
+    # glyph. Values are stored as bytes so must be < 256.
+    def glyph_metrics(self, char):
+        outbuffer, width, _ = self[char]
+        left, right, top, bottom = outbuffer.width, 0, outbuffer.height, 0
+        for row in range(outbuffer.height):
+            for col in range(outbuffer.width):
+                if outbuffer.pixels[row * outbuffer.width + col]:
+                    left = min(left, col)
+                    right = max(right, col + 1)
+                    top = min(top, row)
+                    bottom = row + 1
+        if not right:  # Blank glyph
+            return bytes((width, 0, 0, 0, 0))
+        return bytes((width, right - left, left, top, bottom))
+
+    def build_metrics(self):
+        metrics = bytearray()
+        msparse = bytearray()
+        if len(self.charset) <= MAXCHAR - MINCHAR + 2:
+            # Same order as the normal index. Absent chars get the metrics of
+            # the default char, like their index entry.
+            for char in self.charset:
+                metrics += self.glyph_metrics(char if char else self.charset[0])
+        else:
+            metrics += self.glyph_metrics(self.charset[0])
+            for char in sorted(self.keys()):
+                msparse += ord(char).to_bytes(2, byteorder='little')
+                msparse += (len(metrics)).to_bytes(2, byteorder='little')
+                metrics += self.glyph_metrics(char)
+        return metrics, msparse
+
+    # Inverted glyphs have their lit pixels as 0 bits, which is how black
+    # ink is stored on displays where 1 is white.
+    def stream_char(self, char, hmap, reverse, inverted=False):
         outbuffer, _, _ = self[char]
         if hmap:
             gen = outbuffer.get_hbyte(reverse)
         else:
             gen = outbuffer.get_vbyte(reverse)
+        if inverted:
+            gen = (byte ^ 0xff for byte in gen)
         yield from gen
 
-    def build_arrays(self, hmap, reverse):
+    # Compressed glyph: only the rows between the top and bottom lit rows,
+    # as runs of lit pixels. Consecutive rows with the same runs form a group.
+    # Layout: top row, number of groups, then per group its number of rows,
+    # its number of runs and the runs. A run is one byte gap << 4 | length,
+    # the gap being counted from the end of the previous run, or if either
+    # does not fit in a nibble a zero byte followed by gap and length.
+    def compress_char(self, char):
+        outbuffer, _, _ = self[char]
+        width = outbuffer.width
+        groups = []
+        for row in range(outbuffer.height):
+            pixels = outbuffer.pixels[row * width:(row + 1) * width]
+            runs = []
+            col = 0
+            while col < width:
+                if pixels[col]:
+                    start = col
+                    while col < width and pixels[col]:
+                        col += 1
+                    runs.append((start, col - start))
+                else:
+                    col += 1
+            if groups and groups[-1][1] == runs:
+                groups[-1][0] += 1
+            else:
+                groups.append([1, runs])
+        if groups and not groups[0][1]:
+            top = groups.pop(0)[0]
+        else:
+            top = 0
+        if groups and not groups[-1][1]:
+            groups.pop()
+        data = bytearray((top, len(groups)))
+        for count, runs in groups:
+            data += bytes((count, len(runs)))
+            end = 0
+            for start, length in runs:
+                gap = start - end
+                if gap < 16 and length < 16:
+                    data.append(gap << 4 | length)
+                else:
+                    data += bytes((0, gap, length))
+                end = start + length
+        return data
+
+    def build_arrays(self, hmap, reverse, compress=False, inverted=False):
         data = bytearray()
         index = bytearray()
         sparse = bytearray()
         def append_data(data, char):
             width = self[char][1]
             data += (width).to_bytes(2, byteorder='little')
-            data += bytearray(self.stream_char(char, hmap, reverse))
+            if compress:
+                glyph = self.compress_char(char)
+                data += (len(glyph)).to_bytes(2, byteorder='little')
+                data += glyph
+            else:
+                data += bytearray(self.stream_char(char, hmap, reverse, inverted))
 
         # self.charset is contiguous with chars having ordinal values in the
         # inclusive range specified. Where the specified character set has gaps
@@ -425,13 +512,30 @@ class Font(dict):
                 append_data(data, char)
         return data, index, sparse
 
-    def build_binary_array(self, hmap, reverse, sig):
-        data = bytearray((0x3f + sig, 0xe7, self.max_width, self.height))
+    def build_binary_array(self, hmap, reverse, inverted=False):
+        first = min(self.crange)
+        count = len(self.crange)
+        flags = (1 if hmap else 0) | (2 if reverse else 0) | (4 if self.monospaced else 0)
+        flags |= 8 if inverted else 0
+        data = bytearray(b'MPF1')
+        data += bytes((flags, self.height, self.max_width, self._max_ascent))
+        data += first.to_bytes(2, byteorder='little')
+        data += count.to_bytes(2, byteorder='little')
+        index = bytearray()
+        metrics = bytearray()
+        bitmaps = bytearray()
+        start = len(data) + 9 * len(self.charset)  # Start of the bitmaps
+        offsets = {}
+        # self.charset is the default char followed by every char in the
+        # range, '' where absent.
         for char in self.charset:
-            width = self[char][2]
-            data += bytes((width,))
-            data += bytearray(self.stream_char(char, hmap, reverse))
-        return data
+            char = char if char else self.charset[0]
+            if char not in offsets:
+                offsets[char] = start + len(bitmaps)
+                bitmaps += bytearray(self.stream_char(char, hmap, reverse, inverted))
+            index += offsets[char].to_bytes(4, byteorder='little')
+            metrics += self.glyph_metrics(char)
+        return data + index + metrics + bitmaps
 
 # PYTHON FILE WRITING
 # The index only holds the start of data so can't read next_offset but must
@@ -444,22 +548,31 @@ version = '0.33'
 
 """
 
-# Code emitted for charsets spanning a small range of ordinal values
-STR02 = """_mvfont = memoryview(_font)
-_mvi = memoryview(_index)
-ifb = lambda l : l[0] | (l[1] << 8)
+# Code emitted for charsets spanning a small range of ordinal values.
+# glyph_offset() returns the offset in font_data() of a glyph's width, which
+# its data follows, without allocating. get_ch() is built on it.
+STR02 = """import micropython
 
-def get_ch(ch):
-    oc = ord(ch)
+_mvfont = memoryview(_font)
+
+def font_data():
+    return _mvfont
+
+@micropython.native
+def glyph_offset(oc: int) -> int:
     ioff = 2 * (oc - {0} + 1) if oc >= {0} and oc <= {1} else 0
-    doff = ifb(_mvi[ioff : ])
-    width = ifb(_mvfont[doff : ])
+    return _index[ioff] | (_index[ioff + 1] << 8)
+
+def get_ch(ch):
+    doff = glyph_offset(ord(ch))
+    width = _font[doff] | (_font[doff + 1] << 8)
 """
 
 # Code emiited for large charsets, assumed by build_arrays() to be sparse.
-# Binary search of sorted sparse index.
-STRSP = """_mvfont = memoryview(_font)
-_mvsp = memoryview(_sparse)
+# Binary search of sorted sparse index, bs() being kept for metrics().
+STRSP = """import micropython
+
+_mvfont = memoryview(_font)
 ifb = lambda l : l[0] | (l[1] << 8)
 
 def bs(lst, val):
@@ -472,9 +585,28 @@ def bs(lst, val):
             return 0
         lst = lst[m:] if v < val else lst[:m]
 
+def font_data():
+    return _mvfont
+
+@micropython.native
+def glyph_offset(oc: int) -> int:
+    lo = 0
+    hi = len(_sparse) >> 2
+    while lo < hi:
+        m = (lo + hi) >> 1
+        soff = m << 2
+        v = _sparse[soff] | (_sparse[soff + 1] << 8)
+        if v == oc:
+            return _sparse[soff + 2] | (_sparse[soff + 3] << 8)
+        if v < oc:
+            lo = m + 1
+        else:
+            hi = m
+    return 0
+
 def get_ch(ch):
-    doff = bs(_mvsp, ord(ch))
-    width = ifb(_mvfont[doff : ])
+    doff = glyph_offset(ord(ch))
+    width = _font[doff] | (_font[doff + 1] << 8)
 """
 
 # Code emitted for horizontally mapped fonts.
@@ -484,6 +616,13 @@ STR02H ="""
  
 """
 
+# Code emitted for compressed fonts, see Font.compress_char().
+STR02C ="""
+    length = _font[doff + 2] | (_font[doff + 3] << 8)
+    return _mvfont[doff + 4:doff + 4 + length], {0}, width
+ 
+"""
+
 # Code emitted for vertically mapped fonts.
 STR02V ="""
     next_offs = doff + 2 + (({0} - 1)//8 + 1) * width
@@ -491,6 +630,26 @@ STR02V ="""
  
 """
 
+# Glyph metrics: advance, ink width, left bearing, top and bottom lit rows.
+STRM = """_mvm = memoryview(_metrics)
+
+def metrics(ch):
+    oc = ord(ch)
+    moff = 5 * (oc - {0} + 1) if oc >= {0} and oc <= {1} else 0
+    return _mvm[moff:moff + 5]
+
+"""
+
+# Metrics for sparse charsets. Uses bs() emitted by STRSP.
+STRMSP = """_mvm = memoryview(_metrics)
+_mvmsp = memoryview(_msparse)
+
+def metrics(ch):
+    moff = bs(_mvmsp, ord(ch))
+    return _mvm[moff:moff + 5]
+
+"""
+
 # Extra code emitted where -i is specified.
 STR03 = '''
 def glyphs():
@@ -503,7 +662,8 @@ def write_func(stream, name, arg):
     stream.write('def {}():\n    return {}\n\n'.format(name, arg))
 
 def write_font(op_path, font_path, height, monospaced, hmap, reverse, minchar,
-               maxchar, defchar, charset, iterate, bitmapped):
+               maxchar, defchar, charset, iterate, bitmapped, compress=False,
+               inverted=False):
     try:
         fnt = Font(font_path, height, minchar, maxchar, monospaced, defchar, charset, bitmapped)
     except freetype.ft_errors.FT_Exception:
@@ -511,13 +671,15 @@ def write_font(op_path, font_path, height, monospaced, hmap, reverse, minchar,
         return False
     try:
         with open(op_path, 'w', encoding='utf-8') as stream:
-            write_data(stream, fnt, font_path, hmap, reverse, iterate, charset)
+            write_data(stream, fnt, font_path, hmap, reverse, iterate, charset,
+                       compress, inverted)
     except OSError:
         print("Can't open", op_path, 'for writing')
         return False
     return True
 
-def write_data(stream, fnt, font_path, hmap, reverse, iterate, charset):
+def write_data(stream, fnt, font_path, hmap, reverse, iterate, charset,
+               compress=False, inverted=False):
     height = fnt.height  # Actual height, not target height
     minchar = min(fnt.crange)
     maxchar = max(fnt.crange)
@@ -533,9 +695,11 @@ def write_data(stream, fnt, font_path, hmap, reverse, iterate, charset):
     write_func(stream, 'monospaced', fnt.monospaced)
     write_func(stream, 'min_ch', minchar)
     write_func(stream, 'max_ch', maxchar)
+    write_func(stream, 'compressed', compress)
+    write_func(stream, 'inverted', inverted)
     if iterate:
         stream.write(STR03.format(''.join(sorted(fnt.keys()))))
-    data, index, sparse = fnt.build_arrays(hmap, reverse)
+    data, index, sparse = fnt.build_arrays(hmap, reverse, compress, inverted)
     bw_font = ByteWriter(stream, '_font')
     bw_font.odata(data)
     bw_font.eot()
@@ -549,29 +713,46 @@ def write_data(stream, fnt, font_path, hmap, reverse, iterate, charset):
         bw_index.odata(index)
         bw_index.eot()
         stream.write(STR02.format(minchar, maxchar))
-    if hmap:
+    if compress:
+        stream.write(STR02C.format(height))
+    elif hmap:
         stream.write(STR02H.format(height))
     else:
         stream.write(STR02V.format(height))
+    metrics, msparse = fnt.build_metrics()
+    bw_metrics = ByteWriter(stream, '_metrics')
+    bw_metrics.odata(metrics)
+    bw_metrics.eot()
+    if msparse:
+        bw_msparse = ByteWriter(stream, '_msparse')
+        bw_msparse.odata(msparse)
+        bw_msparse.eot()
+        stream.write(STRMSP)
+    else:
+        stream.write(STRM.format(minchar, maxchar))
 
 # BINARY OUTPUT
-# hmap reverse magic bytes
-# 0    0       0x3f 0xe7
-# 1    0       0x40 0xe7
-# 0    1       0x41 0xe7
-# 1    1       0x42 0xe7
-def write_binary_font(op_path, font_path, height, hmap, reverse):
+# Proportional random access font, read a glyph at a time by
+# src/lib/binfont.py. All values are little-endian.
+# Header (12 bytes): magic b'MPF1', flags (1 hmap, 2 reverse, 4 monospaced,
+# 8 inverted), height, max width, baseline, ordinal value of the first char (2 bytes),
+# number of chars in the range (2 bytes).
+# Index: 4 byte file offset of the bitmap for the default char, then one for
+# each char in the range. Absent chars point at the default char's bitmap.
+# Metrics: 5 bytes per index entry, as in _metrics. The advance is the width
+# of the bitmap.
+# Bitmaps: as in _font without the width prefix, each stored once.
+def write_binary_font(op_path, font_path, height, monospaced, hmap, reverse,
+                      minchar, maxchar, defchar, charset, bitmapped,
+                      inverted=False):
     try:
-        fnt = Font(font_path, height, 32, 126, True, None, '')  # All chars have same width
+        fnt = Font(font_path, height, minchar, maxchar, monospaced, defchar, charset, bitmapped)
     except freetype.ft_errors.FT_Exception:
         print("Can't open", font_path)
         return False
-    sig = 1 if hmap else 0
-    if reverse:
-        sig += 2
     try:
         with open(op_path, 'wb') as stream:
-            data = fnt.build_binary_array(hmap, reverse, sig)
+            data = fnt.build_binary_array(hmap, reverse, inverted)
             stream.write(data)
     except OSError:
         print("Can't open", op_path, 'for writing')
@@ -597,11 +778,6 @@ To specify monospaced rendering issue:
 font_to_py.py FreeSans.ttf 23 --fixed freesans.py
 """
 
-BINARY = """Invalid arguments. Binary (random access) font files support the standard ASCII
-character set (from 32 to 126 inclusive). This range cannot be overridden.
-Random access font files don't support an error character.
-"""
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(__file__, description=DESC,
                                      formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -618,6 +794,10 @@ if __name__ == "__main__":
                         help='Fixed width (monospaced) font')
     parser.add_argument('-b', '--binary', action='store_true',
                         help='Produce binary (random access) font file.')
+    parser.add_argument('-z', '--compress', action='store_true',
+                        help='Compress glyphs as runs of lit pixels. Needs -x.')
+    parser.add_argument('-n', '--inverted', action='store_true',
+                        help='Store lit pixels as 0 bits, ready to blit black on white.')
     parser.add_argument('-i', '--iterate', action='store_true',
                         help='Include generator function to iterate over character set.')
 
@@ -659,57 +839,62 @@ if __name__ == "__main__":
     if args.binary:
         if os.path.splitext(args.outfile)[1].upper() == '.PY':
             quit('Binary file must not have a .py extension.')
+        if args.compress:
+            quit('Binary font files cannot be compressed.')
+    elif not os.path.splitext(args.outfile)[1].upper() == '.PY':
+        quit('Output filename must have a .py extension.')
+    if args.compress and not args.xmap:
+        quit('--compress needs horizontal mapping (-x).')
+    if args.compress and args.inverted:
+        quit('Compressed glyphs cannot be inverted.')
+
+    if args.smallest < 0:
+        quit('--smallest must be >= 0')
+
+    if args.largest > 255:
+        quit('--largest must be < 256')
+    elif args.largest > 127 and os.path.splitext(args.infile)[1].upper() == '.TTF':
+        print('WARNING: extended ASCII characters may not be correctly converted. See docs.')
+
+    if args.errchar < 0 or args.errchar > 255:
+        quit('--errchar must be between 0 and 255')
+    if args.charset and (args.smallest != 32 or args.largest != 126):
+        print('WARNING: specified smallest and largest values ignored.')
+
+    if args.charset_file:
+        try:
+            with open(args.charset_file, 'r', encoding='utf-8') as f:
+                cset = f.read()
+        except OSError:
+            print("Can't open", args.charset_file, 'for reading.')
+            sys.exit(1)
+    else:
+        cset = args.charset
+    # dedupe and remove default char. Allow chars in private use area.
+    # https://github.com/peterhinch/micropython-font-to-py/issues/22
+    cs = {c for c in cset if c.isprintable() or (0xE000 <= ord(c) <= 0xF8FF) } - {args.errchar}
+    cs = sorted(list(cs))
+    cset = ''.join(cs)  # Back to string
+    bitmapped = os.path.splitext(args.infile)[1].upper() in ('.BDF', '.PCF')
+    if bitmapped:
+        if args.height != 0:
+            print('Warning: height arg ignored for bitmapped fonts.')
+        chkface = freetype.Face(args.infile)
+        args.height = chkface._get_available_sizes()[0].height
+        print("Found font with size " + str(args.height))
 
-        if args.smallest != 32 or args.largest != 126 or args.errchar != ord('?') or args.charset:
-            quit(BINARY)
-
+    if args.binary:
         print('Writing binary font file.')
-        if not write_binary_font(args.outfile, args.infile, args.height,
-                                 args.xmap, args.reverse):
+        if not write_binary_font(args.outfile, args.infile, args.height, args.fixed,
+                                 args.xmap, args.reverse, args.smallest, args.largest,
+                                 args.errchar, cset, bitmapped, args.inverted):
             sys.exit(1)
     else:
-        if not os.path.splitext(args.outfile)[1].upper() == '.PY':
-            quit('Output filename must have a .py extension.')
-
-        if args.smallest < 0:
-            quit('--smallest must be >= 0')
-
-        if args.largest > 255:
-            quit('--largest must be < 256')
-        elif args.largest > 127 and os.path.splitext(args.infile)[1].upper() == '.TTF':
-            print('WARNING: extended ASCII characters may not be correctly converted. See docs.')
-
-        if args.errchar < 0 or args.errchar > 255:
-            quit('--errchar must be between 0 and 255')
-        if args.charset and (args.smallest != 32 or args.largest != 126):
-            print('WARNING: specified smallest and largest values ignored.')
-
-        if args.charset_file:
-            try:
-                with open(args.charset_file, 'r', encoding='utf-8') as f:
-                    cset = f.read()
-            except OSError:
-                print("Can't open", args.charset_file, 'for reading.')
-                sys.exit(1)
-        else:
-            cset = args.charset
-        # dedupe and remove default char. Allow chars in private use area.
-        # https://github.com/peterhinch/micropython-font-to-py/issues/22
-        cs = {c for c in cset if c.isprintable() or (0xE000 <= ord(c) <= 0xF8FF) } - {args.errchar}
-        cs = sorted(list(cs))
-        cset = ''.join(cs)  # Back to string
-        bitmapped = os.path.splitext(args.infile)[1].upper() in ('.BDF', '.PCF')
-        if bitmapped:
-            if args.height != 0:
-                print('Warning: height arg ignored for bitmapped fonts.')
-            chkface = freetype.Face(args.infile)
-            args.height = chkface._get_available_sizes()[0].height
-            print("Found font with size " + str(args.height))
-
         print('Writing Python font file.')
         if not write_font(args.outfile, args.infile, args.height, args.fixed,
                           args.xmap, args.reverse, args.smallest, args.largest,
-                          args.errchar, cset, args.iterate, bitmapped):
+                          args.errchar, cset, args.iterate, bitmapped,
+                          args.compress, args.inverted):
             sys.exit(1)
 
     print(args.outfile, 'written successfully.')
@@ -0,0 +1,102 @@
+"""
+Minimal MicroPython shims so that modules from src/ can be imported by host-side
+(CPython) scripts such as the benchmarks. Only what the drivers use is provided.
+"""
+
+import asyncio
+import os
+import struct
+import sys
+import time
+import types
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+MONO_HLSB = 3
+MONO_HMSB = 4
+
+
+class FrameBuffer:
+    """
+    The monochrome horizontal formats of framebuf.FrameBuffer, drawing pixel
+    by pixel in Python, so far slower than MicroPython's C implementation
+    """
+
+    def __init__(self, buffer, width, height, format, stride=None):
+        self.buffer = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+        self.stride_bytes = ((width if stride is None else stride) + 7) // 8
+
+    def _bit(self, x):
+        return 0x80 >> (x & 7) if self.format == MONO_HLSB else 1 << (x & 7)
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        i = y * self.stride_bytes + (x >> 3)
+        bit = self._bit(x)
+        if c is None:
+            return 1 if self.buffer[i] & bit else 0
+        if c:
+            self.buffer[i] |= bit
+        else:
+            self.buffer[i] &= ~bit & 0xFF
+
+    def fill_rect(self, x, y, w, h, c):
+        for row in range(max(y, 0), min(y + h, self.height)):
+            for col in range(max(x, 0), min(x + w, self.width)):
+                self.pixel(col, row, c)
+
+    def fill(self, c):
+        self.fill_rect(0, 0, self.width, self.height, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def blit(self, source, x, y, key=-1, palette=None):
+        for row in range(source.height):
+            for col in range(source.width):
+                c = source.pixel(col, row)
+                if palette is not None:
+                    c = palette.pixel(c, 0)
+                if c != key:
+                    self.pixel(x + col, y + row, c)
+
+
+def install():
+    if "micropython" not in sys.modules:
+        micropython = types.ModuleType("micropython")
+        micropython.const = lambda value: value
+        micropython.native = lambda f: f
+        micropython.viper = lambda f: f
+        sys.modules["micropython"] = micropython
+    sys.modules.setdefault("ustruct", struct)
+    if "uasyncio" not in sys.modules:
+        asyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
+        sys.modules["uasyncio"] = asyncio
+    if not hasattr(time, "sleep_ms"):
+        time.sleep_ms = lambda ms: None
+        time.sleep_us = lambda us: None
+        time.ticks_ms = lambda: int(time.monotonic() * 1000)
+        time.ticks_us = lambda: int(time.monotonic() * 1000000)
+        time.ticks_diff = lambda a, b: a - b
+        time.ticks_add = lambda a, b: a + b
+    if "framebuf" not in sys.modules:
+        framebuf = types.ModuleType("framebuf")
+        framebuf.MONO_HLSB = MONO_HLSB
+        framebuf.MONO_HMSB = MONO_HMSB
+        framebuf.FrameBuffer = FrameBuffer
+        sys.modules["framebuf"] = framebuf
+    if "uctypes" not in sys.modules:
+        uctypes = types.ModuleType("uctypes")
+        # addresses stand for the objects themselves
+        uctypes.addressof = lambda obj: obj
+        uctypes.bytearray_at = lambda obj, size: memoryview(obj)[:size]
+        sys.modules["uctypes"] = uctypes
+    if SRC_PATH not in sys.path:
+        sys.path.insert(0, SRC_PATH)
@@ -0,0 +1,152 @@
+#! /usr/bin/env python3
+"""
+Regenerates the watchface fonts with only the characters the faces can draw.
+
+The texts each face renders come from the phrase tables in src/utils.py, read
+with ast since utils needs the MicroPython modules, plus the fixed strings and
+the date format of the face. The characters are merged per font, so that a
+font shared by several faces keeps one module, and font_to_py.py is run with
+--charset for each. The source font file and size of every font are taken
+from the header of its current module.
+
+Usage:
+    python scripts/subset_fonts.py --print  # only show the character sets
+    python scripts/subset_fonts.py TTF_DIR [--binary]
+"""
+
+import argparse
+import ast
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+UTILS_PATH = os.path.join(ROOT, "src", "utils.py")
+FONTS_PATH = os.path.join(ROOT, "src", "assets", "fonts")
+FONT_TO_PY = os.path.join(ROOT, "scripts", "font_to_py.py")
+
+DIGITS = "0123456789"
+
+
+def phrases(*functions: str) -> str:
+    """
+    :return: every string that the named functions in src/utils.py can
+    return, i.e. their string literals and those of the module-level lists
+    they use, docstrings excluded
+    """
+    with open(UTILS_PATH, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    tables = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.List):
+            for target in node.targets:
+                if isinstance(target, ast.Name):
+                    tables[target.id] = node.value
+    texts = []
+
+    def collect(node):
+        for child in ast.walk(node):
+            if isinstance(child, ast.Constant) and isinstance(child.value, str):
+                texts.append(child.value)
+            elif isinstance(child, ast.Name) and child.id in tables:
+                collect(tables.pop(child.id))
+
+    found = set()
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name in functions:
+            found.add(node.name)
+            body = node.body
+            if ast.get_docstring(node) is not None:
+                body = body[1:]
+            for statement in body:
+                collect(statement)
+    missing = set(functions) - found
+    if missing:
+        raise ValueError("Not in utils.py: {}".format(", ".join(sorted(missing))))
+    return "".join(texts)
+
+
+def prose_face() -> dict:
+    """
+    :return: font module name -> text drawn by Watchy.display_prose_watchface()
+    """
+    return {
+        "fira_sans_bold_58": phrases("hour_to_string"),
+        "fira_sans_regular_38": "o'clock oh "
+        + phrases("number_teen_to_string", "number_tens_to_string"),
+        # f"{week_day_str}, {day} {month_str}"
+        "fira_sans_regular_28": ", "
+        + DIGITS
+        + phrases("week_day_to_short_string", "month_to_short_string"),
+    }
+
+
+FACES = {"prose": prose_face}
+
+
+def charsets() -> dict:
+    """
+    :return: font module name -> sorted characters used by any face
+    """
+    fonts: dict[str, set[str]] = {}
+    for face in FACES.values():
+        for font, text in face().items():
+            fonts.setdefault(font, set()).update(text)
+    return {font: "".join(sorted(chars)) for font, chars in fonts.items()}
+
+
+def font_source(font: str):
+    """
+    :return: (font file name, size) from the header of the font's module
+    """
+    path = os.path.join(FONTS_PATH, font + ".py")
+    filename = size = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.startswith("#"):
+                break
+            if line.startswith("# Font:"):
+                filename = line.split()[2]
+            elif line.startswith("# Cmd:"):
+                args = line.split()
+                for i, arg in enumerate(args[:-1]):
+                    if os.path.basename(arg) == filename:
+                        size = int(args[i + 1])
+    if filename is None or size is None:
+        raise ValueError("No font_to_py header in {}".format(path))
+    return filename, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("ttf_dir", nargs="?", help="directory with the font files")
+    parser.add_argument(
+        "--print", action="store_true", help="print the character sets and exit"
+    )
+    parser.add_argument(
+        "--binary", action="store_true", help="write binary fonts for lib.binfont"
+    )
+    args = parser.parse_args()
+    fonts = charsets()
+    if args.print:
+        for font, chars in fonts.items():
+            print("{}: {!r}".format(font, chars))
+        return
+    if args.ttf_dir is None:
+        parser.error("TTF_DIR is required unless --print is given")
+    ttf_dir = os.path.abspath(args.ttf_dir)
+    for font, chars in fonts.items():
+        filename, size = font_source(font)
+        # Display prints black on white, which inverted glyphs blit as they are
+        command = [sys.executable, FONT_TO_PY, "-x", "--inverted", "--charset", chars]
+        if args.binary:
+            command.append("--binary")
+        # font_to_py wants an output path that starts with a letter
+        out = font + (".bin" if args.binary else ".py")
+        command += [os.path.join(ttf_dir, filename), str(size), out]
+        print(" ".join(command))
+        subprocess.run(command, check=True, cwd=FONTS_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -14,4 +14,6 @@ RTC_INT_PIN = const(27)
 
 VIBRATE_MOTOR_PIN = const(13)
 
-BATT_ADC_PIN = const(33)
\ No newline at end of file
+BATT_ADC_PIN = const(33)
+
+EPD_PANEL = "GDEH0154D67"  # e-paper panel revision, see lib/epaper1in54.py
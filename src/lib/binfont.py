@@ -0,0 +1,134 @@
+"""
+Fonts in the binary format written by `scripts/font_to_py.py --binary`.
+
+The glyphs stay in flash and are read on demand with readinto() into a few
+preallocated buffers, which double as a small LRU cache. Only the header,
+the index and the metrics are held in RAM. A BinFont has the same functions
+as a font module generated by font_to_py, so it can be handed to Writer and
+Display.display_text() in place of one.
+"""
+
+from micropython import const
+import ustruct
+
+MAGIC = b"MPF1"
+# magic, flags, height, max width, baseline, first char, number of chars
+HEADER = "<4sBBBBHH"
+HEADER_SIZE = const(12)
+METRICS_SIZE = const(5)
+
+HMAP = const(1)
+REVERSE = const(2)
+MONOSPACED = const(4)
+INVERTED = const(8)
+
+
+class BinFont:
+    def __init__(self, path: str, cache_size: int = 4):
+        """
+        :param cache_size: glyphs kept in RAM, at least 1. The buffer of a
+        glyph returned by get_ch() is reused once cache_size other glyphs have
+        been fetched since.
+        :raises ValueError: if the file is not a binary font
+        """
+        self._file = open(path, "rb")
+        header = self._file.read(HEADER_SIZE)
+        if len(header) != HEADER_SIZE or header[:4] != MAGIC:
+            self._file.close()
+            raise ValueError("Not a binary font: {}".format(path))
+        (
+            _,
+            self._flags,
+            self._height,
+            self._max_width,
+            self._baseline,
+            self._first,
+            self._count,
+        ) = ustruct.unpack(HEADER, header)
+        entries = self._count + 1  # the default char comes first
+        self._index = bytearray(4 * entries)
+        self._metrics = bytearray(METRICS_SIZE * entries)
+        self._file.readinto(self._index)
+        self._file.readinto(self._metrics)
+        self._mvm = memoryview(self._metrics)
+        size = self._glyph_size(self._max_width)
+        cache_size = max(1, cache_size)
+        self._buffers = [memoryview(bytearray(size)) for _ in range(cache_size)]
+        self._offsets = [-1] * cache_size  # file offset of each buffer's glyph
+        self._used = [0] * cache_size  # when each buffer was last returned
+        self._clock = 0
+
+    def close(self):
+        self._file.close()
+
+    def height(self):
+        return self._height
+
+    def baseline(self):
+        return self._baseline
+
+    def max_width(self):
+        return self._max_width
+
+    def hmap(self):
+        return bool(self._flags & HMAP)
+
+    def reverse(self):
+        return bool(self._flags & REVERSE)
+
+    def monospaced(self):
+        return bool(self._flags & MONOSPACED)
+
+    def inverted(self):
+        return bool(self._flags & INVERTED)
+
+    def min_ch(self):
+        return self._first
+
+    def max_ch(self):
+        return self._first + self._count - 1
+
+    def _entry(self, ch) -> int:
+        oc = ord(ch) - self._first
+        return oc + 1 if 0 <= oc < self._count else 0
+
+    def _glyph_size(self, width: int) -> int:
+        if self._flags & HMAP:
+            return ((width - 1) // 8 + 1) * self._height
+        return ((self._height - 1) // 8 + 1) * width
+
+    def metrics(self, ch):
+        """
+        :return: advance, ink width, left bearing, top and bottom lit rows,
+        like metrics() in generated font modules
+        """
+        moff = METRICS_SIZE * self._entry(ch)
+        return self._mvm[moff : moff + METRICS_SIZE]
+
+    def get_ch(self, ch):
+        """
+        :return: (glyph bitmap, height, width) like get_ch() in generated font
+        modules
+        """
+        entry = self._entry(ch)
+        index = self._index
+        i = 4 * entry
+        offset = index[i] | index[i + 1] << 8 | index[i + 2] << 16 | index[i + 3] << 24
+        width = self._metrics[METRICS_SIZE * entry]
+        offsets = self._offsets
+        used = self._used
+        slot = 0
+        for n in range(len(offsets)):
+            if offsets[n] == offset:
+                slot = n
+                break
+            if used[n] < used[slot]:
+                slot = n  # least recently used so far
+        buf = self._buffers[slot][: self._glyph_size(width)]
+        if offsets[slot] != offset:
+            self._file.seek(offset)
+            self._file.readinto(buf)
+            offsets[slot] = offset
+        self._clock += 1
+        used[slot] = self._clock
+        return buf, self._height, width
@@ -1,12 +1,115 @@
-from constants import BLACK, WHITE
-from lib.epaper1in54 import EPD
+from constants import BLACK, EPD_PANEL, WHITE
+from lib.epaper1in54 import (
+    DEEP_SLEEP_1,
+    DEEP_SLEEP_OFF,
+    EPD,
+    FULL_WINDOW,
+    SPEED_NORMAL,
+    WRITE_RAM,
+    WRITE_RAM_RED,
+    align_window,
+)
+from lib.retained import RetainedState
 from lib.writer import Writer
 from machine import Pin, SPI
+import esp32
 import framebuf
+import machine
+import time
 
 # fonts
 import assets.fonts.fira_sans_regular_24 as fira_sans_regular_24
 
+MAX_DIRTY_RECTS = 4  # more windows than this are merged
+DIRTY_MERGE_ROWS = 4  # bands separated by fewer unchanged rows are merged
+
+
+def dirty_rects(new: bytearray, old: bytearray, width_bytes: int) -> list:
+    """
+    Compares two MONO_HLSB frames and returns the byte-aligned (x, y, w, h)
+    rectangles, in pixels, that cover every changed byte. Returns an empty
+    list when the frames are identical.
+    """
+    if new == old:
+        return []
+    new_mv = memoryview(new)
+    old_mv = memoryview(old)
+    bands: list[list[int]] = []  # [first_row, last_row, first_byte, last_byte]
+    for row in range(len(new) // width_bytes):
+        start = row * width_bytes
+        end = start + width_bytes
+        if new_mv[start:end] == old_mv[start:end]:
+            continue
+        lo = start
+        while new[lo] == old[lo]:
+            lo += 1
+        hi = end - 1
+        while new[hi] == old[hi]:
+            hi -= 1
+        lo -= start
+        hi -= start
+        if bands and row - bands[-1][1] <= DIRTY_MERGE_ROWS:
+            band = bands[-1]
+            band[1] = row
+            band[2] = min(band[2], lo)
+            band[3] = max(band[3], hi)
+        else:
+            bands.append([row, row, lo, hi])
+    while len(bands) > MAX_DIRTY_RECTS:
+        # merge the two neighbouring bands with the smallest gap between them
+        i = min(range(len(bands) - 1), key=lambda i: bands[i + 1][0] - bands[i][1])
+        upper, lower = bands[i], bands.pop(i + 1)
+        upper[1] = lower[1]
+        upper[2] = min(upper[2], lower[2])
+        upper[3] = max(upper[3], lower[3])
+    return [
+        (lo * 8, first, (hi - lo + 1) * 8, last - first + 1)
+        for first, last, lo, hi in bands
+    ]
+
+
+class RefreshPolicy:
+    """
+    Decides whether an update gets a fast partial refresh or a full refresh,
+    which clears the ghosting that partial refreshes build up. The counters
+    live in the RetainedState passed in, so they survive deep sleep.
+    """
+
+    def __init__(
+        self,
+        max_partial_updates: int = 10,
+        max_interval_s: int = 3600,
+        full_update_ratio: float = 0.5,
+    ):
+        """
+        :param max_partial_updates: partial refreshes before a full one
+        :param max_interval_s: longest time between full refreshes
+        :param full_update_ratio: fraction of the screen that, once changed,
+        gets a full refresh
+        """
+        self.max_partial_updates = max_partial_updates
+        self.max_interval_s = max_interval_s
+        self.full_update_ratio = full_update_ratio
+
+    def use_partial(self, state: RetainedState, changed: int, total: int, now: int):
+        """
+        :param changed: changed area, in pixels
+        :param total: screen area, in pixels
+        :param now: current time, in seconds
+        """
+        return (
+            state.partial_count < self.max_partial_updates
+            and 0 <= now - state.last_full_time < self.max_interval_s
+            and changed < total * self.full_update_ratio
+        )
+
+    def refreshed(self, state: RetainedState, partial: bool, now: int):
+        if partial:
+            state.partial_count += 1
+        else:
+            state.partial_count = 0
+            state.last_full_time = now
+
 
 class Display:
 
@@ -16,10 +119,27 @@ class Display:
     MAX_WIDTH = 200
     MAX_HEIGHT = 200
 
-    def __init__(self):
-        cs = Pin(5, Pin.OUT, value=1)
+    def __init__(
+        self,
+        hw_mirror_y=True,
+        policy: RefreshPolicy | None = None,
+        panel: str = EPD_PANEL,
+        sleep_mode: int | None = DEEP_SLEEP_1,
+    ):
+        """
+        :param hw_mirror_y: mirror Y using the panel's RAM addressing, set to
+        False for panels that need the rows reordered in software
+        :param policy: chooses between partial and full refreshes
+        :param panel: panel revision, see lib.epaper1in54
+        :param sleep_mode: deep sleep mode the panel enters after each
+        refresh, or on the next boot after update(wait=False), see
+        EPD.sleep(), or None to keep it powered
+        """
+        # hold=False releases the latch from hold_pins() before deep sleep
+        cs = Pin(5, Pin.OUT, value=1, hold=False)
         dc = Pin(10, Pin.OUT, value=0)
-        reset = Pin(9, Pin.OUT, value=0)
+        reset = Pin(9, Pin.OUT, value=1, hold=False)  # low would reset the panel
+        self._held_pins = (cs, reset)
         busy = Pin(19, Pin.IN)
 
         sck = Pin(18)
@@ -34,29 +154,266 @@ class Display:
             mosi=mosi,
             miso=miso,
         )
-        self.epd = EPD(spi=spi, cs=cs, dc=dc, rst=reset, busy=busy)
+        self.epd = EPD(
+            spi=spi,
+            cs=cs,
+            dc=dc,
+            rst=reset,
+            busy=busy,
+            hw_mirror_y=hw_mirror_y,
+            panel=panel,
+        )
         self.current_x = 0
         self.current_y = 0
         self.buffer = bytearray(self.MAX_WIDTH * self.MAX_HEIGHT // 8)
+        # what is on the panel, for sending only the changes on the next update
+        self.last_frame = bytearray(len(self.buffer))
+        self.last_frame_valid = False
         self.framebuf = framebuf.FrameBuffer(
             self.buffer,
             self.MAX_WIDTH,
             self.MAX_HEIGHT,
             framebuf.MONO_HLSB,
         )
-        self.epd.init()
-        self.epd.hw_init()
+        self.policy = RefreshPolicy() if policy is None else policy
+        self.sleep_mode = sleep_mode
+        # font module -> Writer, see display_text()
+        self._writers: dict[object, Writer] = {}
+        self.retained = RetainedState()
+        frame_valid = self.retained.load(self.last_frame)
+        if self.retained.refresh_pending:
+            # let the refresh left running before deep sleep finish first
+            self.epd.wait_until_idle()
+        if (
+            machine.reset_cause() == machine.DEEPSLEEP_RESET
+            and self.retained.panel_ready
+        ):
+            # the panel kept its configuration and RAM through the deep sleep,
+            # or is itself asleep and is woken before the next transfer
+            self.epd.warm_init(
+                self.retained.waveform,
+                asleep=self.retained.sleep_mode != DEEP_SLEEP_OFF,
+            )
+            self.last_frame_valid = frame_valid
+        else:
+            self.epd.init()
+            self.restore_frame(frame_valid)
+            self.retained.panel_ready = True
+            self.retained.waveform = None
+            self.retained.refresh_pending = False
+            self.retained.pending_windows = []
+            self.retained.sleep_mode = DEEP_SLEEP_OFF
+            self.retained.save_state()
+        if self.retained.refresh_pending:
+            # the refresh left running by update(wait=False) is done, so the
+            # panel can sleep until the next transfer wakes it
+            self._finish_refresh()
+            self._sleep_panel(self.sleep_mode)
+            self.retained.save_state()
+
+    def restore_frame(self, valid: bool):
+        """
+        Loads the frame retained from before deep sleep into both panel RAMs,
+        so that the next update can be a differential partial refresh. Without
+        a valid frame, the next update is a full refresh.
+        """
+        self.last_frame_valid = valid
+        if valid:
+            for ram in (WRITE_RAM, WRITE_RAM_RED):
+                self.epd.write_window(
+                    self.last_frame,
+                    0,
+                    0,
+                    self.MAX_WIDTH,
+                    self.MAX_HEIGHT,
+                    mirror_y=True,
+                    command=ram,
+                )
+
+    def _finish_refresh(self):
+        """
+        Completes an update made with wait=False once the panel is idle, by
+        bringing the old image RAM in step with the glass
+        """
+        if not self.retained.refresh_pending:
+            return
+        self.epd.wait_until_idle()
+        if self.last_frame_valid:
+            self.epd.write_old_image(self.last_frame, self.retained.pending_windows)
+        self.retained.refresh_pending = False
+        self.retained.pending_windows = []
+        self.retained.save_state()
+
+    def _wake(self):
+        """
+        Wakes the panel from deep sleep before a transfer, restoring its RAM
+        if the sleep mode lost it
+        """
+        if not self.epd.asleep:
+            return
+        self.epd.wake()
+        self._woken()
+
+    async def _wake_async(self):
+        if not self.epd.asleep:
+            return
+        await self.epd.wake_async()
+        self._woken()
+
+    def _woken(self):
+        if self.retained.sleep_mode != DEEP_SLEEP_1:
+            self.restore_frame(self.last_frame_valid)
+        self.retained.sleep_mode = DEEP_SLEEP_OFF
+
+    def _sleep_panel(self, mode: int | None):
+        if mode is not None and not self.epd.asleep:
+            self.epd.sleep(mode)
+            self.retained.sleep_mode = mode
 
-    def update(self, buffer: bytearray | None = None, mirror_y=True, partial=False):
+    def hold_pins(self):
+        """
+        Latches CS and RST high through the MCU's deep sleep, so that the panel
+        is neither selected nor reset while it finishes a refresh started with
+        update(wait=False). Call it right before machine.deepsleep().
+        """
+        for pin in self._held_pins:
+            pin.init(hold=True)
+        if hasattr(esp32, "gpio_deep_sleep_hold"):
+            # CS and RST are not RTC GPIOs
+            esp32.gpio_deep_sleep_hold(True)
+
+    def _plan_update(
+        self, buffer: bytearray | None, partial: bool | None, force: bool
+    ) -> tuple[bytearray, list, bool]:
+        """
+        :return: (frame, windows to send, partial), windows is empty when the
+        panel already shows the frame
+        """
         target_buffer = self.buffer if buffer is None else buffer
-        self.epd.display_buffer(target_buffer, mirror_y=mirror_y, partial=partial)
+        if self.last_frame_valid and not force:
+            windows = dirty_rects(target_buffer, self.last_frame, self.MAX_WIDTH // 8)
+        else:
+            windows = list(FULL_WINDOW)
+        if partial is None:
+            partial = self.last_frame_valid and self.policy.use_partial(
+                self.retained,
+                sum(w * h for _, _, w, h in windows),
+                self.MAX_WIDTH * self.MAX_HEIGHT,
+                int(time.time()),
+            )
+        return target_buffer, windows, partial
+
+    def _frame_sent(self, buffer: bytearray, windows: list, partial: bool, wait=True):
+        self.last_frame[:] = buffer
+        self.last_frame_valid = True
+        self.policy.refreshed(self.retained, partial, int(time.time()))
+        self.retained.waveform = self.epd.loaded_waveform
+        self.retained.refresh_pending = not wait
+        self.retained.pending_windows = [] if wait else list(windows)
+        if wait:
+            # a refresh left running is finished by the panel while awake
+            self._sleep_panel(self.sleep_mode)
+        self.retained.save(self.last_frame)
+
+    def update(
+        self,
+        buffer: bytearray | None = None,
+        mirror_y=True,
+        partial: bool | None = None,
+        force=False,
+        wait=True,
+    ) -> bool:
+        """
+        Sends the frame to the panel and refreshes it. Only the rectangles that
+        changed since the last update are sent, and nothing at all happens when
+        the frame is unchanged, unless `force` is set.
+        :param partial: defaults to asking the refresh policy, which is only
+        consulted when the previous frame is known
+        :param wait: with False, returns as soon as the refresh has started, so
+        that the MCU can deep sleep (see hold_pins()) while the panel finishes
+        it; the refresh is completed on the next update or wake
+        :return: whether the panel was refreshed
+        """
+        self._finish_refresh()
+        target_buffer, windows, partial = self._plan_update(buffer, partial, force)
+        if not windows:
+            return False
+        self._wake()
+        self.epd.display_windows(
+            target_buffer, windows, mirror_y=mirror_y, partial=partial, wait=wait
+        )
+        self._frame_sent(target_buffer, windows, partial, wait)
+        return True
+
+    async def update_async(
+        self,
+        buffer: bytearray | None = None,
+        mirror_y=True,
+        partial: bool | None = None,
+        force=False,
+    ) -> bool:
+        """
+        Like update(), but lets other tasks run during the refresh waveform
+        """
+        if self.retained.refresh_pending:
+            await self.epd.wait_until_idle_async()
+            self._finish_refresh()
+        target_buffer, windows, partial = self._plan_update(buffer, partial, force)
+        if not windows:
+            return False
+        await self._wake_async()
+        await self.epd.display_windows_async(
+            target_buffer, windows, mirror_y=mirror_y, partial=partial
+        )
+        self._frame_sent(target_buffer, windows, partial)
+        return True
+
+    def update_region(
+        self,
+        x: int,
+        y: int,
+        w: int,
+        h: int,
+        buffer: bytearray | None = None,
+        mirror_y=True,
+    ):
+        """
+        Partially refreshes only the given region (widened to byte boundaries)
+        """
+        self._finish_refresh()
+        target_buffer = self.buffer if buffer is None else buffer
+        self._wake()
+        self.epd.display_window(target_buffer, x, y, w, h, mirror_y=mirror_y)
+        x, y, w, h = align_window(x, y, w, h)
+        width_bytes = self.MAX_WIDTH // 8
+        for row in range(y, y + h):
+            start = row * width_bytes + x // 8
+            end = start + w // 8
+            self.last_frame[start:end] = target_buffer[start:end]
+        self.policy.refreshed(self.retained, True, int(time.time()))
+        self.retained.waveform = self.epd.loaded_waveform
+        self._sleep_panel(self.sleep_mode)
+        self.retained.save(self.last_frame if self.last_frame_valid else None)
+
+    def set_temperature(self, temperature: float | None, speed: int = SPEED_NORMAL):
+        """
+        Picks the refresh waveform for the ambient temperature, e.g. from
+        DS3231.temperature(), and a speed class (SPEED_FAST, SPEED_NORMAL or
+        SPEED_CLEAN from lib.epaper1in54)
+        """
+        self.epd.set_temperature(temperature, speed)
 
     def fill(self, color: int):
         self.framebuf.fill(color)
         self.update()
 
-    def sleep(self):
-        self.epd.sleep()
+    def sleep(self, mode: int = DEEP_SLEEP_1):
+        """
+        Puts the panel into deep sleep now, see EPD.sleep()
+        """
+        self._finish_refresh()
+        self._sleep_panel(mode)
+        self.retained.save_state()
 
     def display_text(
         self,
@@ -67,13 +424,34 @@ class Display:
         background_colour: int,
         text_colour: int,
     ):
-        wri = Writer(
-            self.framebuf,
-            font,
-            self.MAX_WIDTH,
-            self.MAX_HEIGHT,
-            background_colour,
-            text_colour,
-        )
-        wri.set_textpos(self.framebuf, y, x)
-        wri.printstring(text)
+        wri = self._writer(font)
+        wri.bgcolor = background_colour
+        wri.fgcolor = text_colour
+        if (
+            "\n" in text
+            or "\t" in text
+            or y + wri.height > self.MAX_HEIGHT
+            or x + wri.stringlen(text) > self.MAX_WIDTH
+        ):
+            wri.set_textpos(self.framebuf, y, x)
+            wri.printstring(text)
+        else:
+            # fits on one line, drawn the same with less overhead per glyph
+            wri.render_run(text, x, y)
+
+    def _writer(self, font) -> Writer:
+        """
+        :return: the Writer for `font`, created on first use
+        """
+        wri = self._writers.get(font)
+        if wri is None:
+            wri = Writer(
+                self.framebuf,
+                font,
+                self.MAX_WIDTH,
+                self.MAX_HEIGHT,
+                verbose=False,
+                buffer=self.buffer,
+            )
+            self._writers[font] = wri
+        return wri
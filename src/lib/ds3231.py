@@ -80,6 +80,7 @@ class DS3231:
         self._buf = bytearray(1)  # Pre-allocate a single bytearray for re-use
         self._al1_buf = bytearray(4)
         self._al2buf = bytearray(3)
+        self._tempbuf = bytearray(2)
 
     def datetime(self, datetime=None):
         """Get or set datetime
@@ -308,6 +309,16 @@ class DS3231:
                 self.addr, STATUS_REG, bytearray([status & (~(1 << 3))])
             )
 
+    def temperature(self):
+        """Returns the temperature in Celsius, in steps of 0.25
+
+        The DS3231 converts every 64 seconds for its own TCXO"""
+        self.i2c.readfrom_mem_into(self.addr, TEMPERATURE_REG, self._tempbuf)
+        msb = self._tempbuf[0]
+        if msb & 0x80:  # two's complement
+            msb -= 256
+        return msb + (self._tempbuf[1] >> 6) * 0.25
+
     def OSF(self):
         """Returns the oscillator stop flag (OSF).
 
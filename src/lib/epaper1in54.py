@@ -25,8 +25,9 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
-from time import sleep_ms  # type: ignore
+from time import sleep_ms, ticks_diff, ticks_ms  # type: ignore
 
+import uasyncio as asyncio
 import ustruct
 from micropython import const
 
@@ -41,7 +42,8 @@ BOOSTER_SOFT_START_CONTROL = const(0x0C)
 DEEP_SLEEP_MODE = const(0x10)
 DATA_ENTRY_MODE_SETTING = const(0x11)
 SW_RESET = const(0x12)
-# TEMPERATURE_SENSOR_CONTROL           = const(0x1A)
+TEMPERATURE_SENSOR_SELECTION = const(0x18)
+TEMPERATURE_SENSOR_CONTROL = const(0x1A)  # write to temperature register
 MASTER_ACTIVATION = const(0x20)
 # DISPLAY_UPDATE_CONTROL_1             = const(0x21)
 DISPLAY_UPDATE_CONTROL_2 = const(0x22)
@@ -58,11 +60,122 @@ SET_RAM_X_ADDRESS_COUNTER = const(0x4E)
 SET_RAM_Y_ADDRESS_COUNTER = const(0x4F)
 TERMINATE_FRAME_READ_WRITE = const(0xFF)  # aka NOOP
 
+# DATA_ENTRY_MODE_SETTING values (AM=0, i.e. X is the fast axis)
+X_INC_Y_DEC = const(0x01)
+X_INC_Y_INC = const(0x03)
+
+# DISPLAY_UPDATE_CONTROL_2 sequences: enable clock and analog, then
+UPDATE_FULL = const(0xF7)  # load temperature and LUT, display mode 1
+UPDATE_PARTIAL = const(0xFF)  # load temperature and LUT, display mode 2
+UPDATE_FULL_LOADED = const(0xC7)  # display mode 1 with the loaded LUT
+UPDATE_PARTIAL_LOADED = const(0xCF)  # display mode 2 with the loaded LUT
+LOAD_LUT_FULL = const(0x91)  # only load the display mode 1 LUT
+LOAD_LUT_PARTIAL = const(0x99)  # only load the display mode 2 LUT
+UPDATE_RAM_LUT = const(0xC4)  # GDEH0154D27: display with the LUT in RAM
+
+# Waveform speed classes
+SPEED_FAST = const(0)
+SPEED_NORMAL = const(1)
+SPEED_CLEAN = const(2)
+
+# Upper bounds in Celsius of the temperature bands, the last band is open-ended
+TEMPERATURE_BANDS = (5, 15, 25, 35)
+# Temperature written to the controller, which then loads the matching OTP
+# waveform, for each band by (fast, normal, clean) speed class. Fast borrows
+# the hot waveform and clean a colder one; both wash out in the cold. Below
+# the first bound the controller measures the temperature itself, so that it
+# still picks its sub-zero waveforms.
+WAVEFORMS = (
+    None,
+    (10, 10, 0),
+    (100, 20, 10),
+    (100, 30, 20),
+    (100, 40, 30),
+)
+
+# Panel revisions
+GDEH0154D27 = "GDEH0154D27"  # IL3829, waveforms uploaded to RAM
+GDEH0154D67 = "GDEH0154D67"  # SSD1681, waveforms in OTP
+
+# Init sequences as (command, length, data...) records. WAIT in the length
+# waits for BUSY after the command. The RAM window and data entry mode are set
+# before every transfer by set_window().
+WAIT = const(0x80)
+# fmt: off
+INIT_SEQUENCES = {
+    GDEH0154D27: bytes((
+        DRIVER_OUTPUT_CONTROL, 3, 0xC7, 0x00, 0x00,  # 200 gates, GD=0 SM=0 TB=0
+        BOOSTER_SOFT_START_CONTROL, 3, 0xD7, 0xD6, 0x9D,
+        WRITE_VCOM_REGISTER, 1, 0xA8,  # VCOM 7C
+        SET_DUMMY_LINE_PERIOD, 1, 0x1A,  # 4 dummy lines per gate
+        SET_GATE_TIME, 1, 0x08,  # 2us per line
+    )),
+    GDEH0154D67: bytes((
+        SW_RESET, WAIT,
+        DRIVER_OUTPUT_CONTROL, 3, 0xC7, 0x00, 0x00,  # 200 gates, GD=0 SM=0 TB=0
+        BORDER_WAVEFORM_CONTROL, 1, 0x05,
+        TEMPERATURE_SENSOR_SELECTION, 1, 0x80,  # internal sensor
+    )),
+}
+# fmt: on
+
+
+# DEEP_SLEEP_MODE parameter. BUSY stays high in deep sleep and only a
+# hardware reset wakes the controller.
+DEEP_SLEEP_OFF = const(0x00)
+DEEP_SLEEP_1 = const(0x01)  # keeps the RAM content
+DEEP_SLEEP_2 = const(0x03)  # loses the RAM content, lowest current
+
 BUSY = const(1)  # 1=busy, 0=idle
+BUSY_POLL_MS = const(10)  # polling interval of the blocking BUSY wait
+BUSY_TIMEOUT_MS = const(10000)  # cold full refreshes take several seconds
+RESET_DELAY_MS = const(200)
+WAKE_RESET_MS = const(10)  # enough for a powered panel leaving deep sleep
+
+WIDTH_BYTES = const(EPD_WIDTH // 8)
+FULL_WINDOW = ((0, 0, EPD_WIDTH, EPD_HEIGHT),)
+
+
+def compile_sequence(sequence: bytes) -> tuple:
+    """
+    Splits an init sequence into (command, data or None, wait) memoryviews
+    once, so that replaying it allocates nothing.
+    """
+    mv = memoryview(sequence)
+    records = []
+    i = 0
+    while i < len(sequence):
+        length = sequence[i + 1] & ~WAIT
+        data = mv[i + 2 : i + 2 + length] if length else None
+        records.append((mv[i : i + 1], data, bool(sequence[i + 1] & WAIT)))
+        i += 2 + length
+    return tuple(records)
+
+
+def align_window(x: int, y: int, w: int, h: int):
+    """
+    Widens a window to byte boundaries horizontally and clips it to the panel.
+    Returns (x, y, w, h), w or h is 0 if nothing is left.
+    """
+    x_end = min(EPD_WIDTH, (x + w + 7) & ~7)
+    y_end = min(EPD_HEIGHT, y + h)
+    x = max(0, x & ~7)
+    y = max(0, y)
+    return x, y, max(0, x_end - x), max(0, y_end - y)
 
 
 class EPD:
-    def __init__(self, spi, cs, dc, rst, busy):
+    # compiled INIT_SEQUENCES, shared by all instances
+    _sequences = {}  # type: ignore
+
+    def __init__(
+        self, spi, cs, dc, rst, busy, hw_mirror_y=True, panel: str = GDEH0154D67
+    ):
+        if panel not in INIT_SEQUENCES:
+            raise ValueError("Unknown panel {}".format(panel))
+        if panel not in EPD._sequences:
+            EPD._sequences[panel] = compile_sequence(INIT_SEQUENCES[panel])
+        self.panel = panel
         self.spi = spi
         self.cs = cs
         self.dc = dc
@@ -70,6 +183,17 @@ class EPD:
         self.busy = busy
         self.width = EPD_WIDTH
         self.height = EPD_HEIGHT
+        self._row_buffer = bytearray(EPD_WIDTH // 8)  # scratch row for invert
+        # mirror Y with the RAM address counters instead of reordering rows
+        self.hw_mirror_y = hw_mirror_y
+        self.lut = None  # LUT currently in the controller
+        self.waveform: int | None = None  # temperature to select the waveform with
+        # (temperature, partial) loaded from OTP
+        self.loaded_waveform: tuple[int, bool] | None = None
+        self.asleep = False  # in deep sleep, see sleep()
+        self._command = bytearray(1)
+        self._params = bytearray(4)
+        self._params_mv = memoryview(self._params)
 
     LUT_FULL_UPDATE = bytearray(
         b"\x02\x02\x01\x11\x12\x12\x22\x22\x66\x69\x69\x59\x58\x99\x99\x88\x00\x00\x00\x00\xF8\xB4\x13\x51\x35\x51\x51\x19\x01\x00"
@@ -78,13 +202,23 @@ class EPD:
         b"\x10\x18\x18\x08\x18\x18\x08\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x13\x14\x44\x12\x00\x00\x00\x00\x00\x00"
     )
 
-    def send_command(self, command: int, data: bytearray = None):
+    def send_command(self, command: int, data: bytearray | memoryview | None = None):
+        """
+        Sends the command and its data in a single CS frame
+        """
+        self._command[0] = command
         self.dc.off()
         self.cs.off()
-        self.spi.write(bytearray([command]))
-        self.cs.on()
+        self.spi.write(self._command)
         if data is not None:
-            self.send_data(data)
+            self.dc.on()
+            self.spi.write(data)
+        self.cs.on()
+
+    def _send_params(self, command: int, *params):
+        for i, param in enumerate(params):
+            self._params[i] = param
+        self.send_command(command, self._params_mv[: len(params)])
 
     def send_data(self, data: bytearray):
         self.dc.on()
@@ -92,81 +226,246 @@ class EPD:
         self.spi.write(data)
         self.cs.on()
 
-    def init(self):
-        self.reset()
-        self.send_command(DRIVER_OUTPUT_CONTROL)
-        self.send_data(bytearray([((EPD_HEIGHT - 1) >> 8) & 0xFF]))
-        self.send_data(bytearray([((EPD_HEIGHT - 1)) & 0xFF]))
-        self.send_data(bytearray([0x00]))  # GD = 0 SM = 0 TB = 0
-        self.send_command(BOOSTER_SOFT_START_CONTROL, b"\xD7\xD6\x9D")
-        self.send_command(WRITE_VCOM_REGISTER, b"\xA8")  # VCOM 7C
-        self.send_command(SET_DUMMY_LINE_PERIOD, b"\x1A")  # 4 dummy lines per gate
-        self.send_command(SET_GATE_TIME, b"\x08")  # 2us per line
-        self.send_command(DATA_ENTRY_MODE_SETTING, b"\x03")  # X increment Y increment
-        self.set_lut(self.LUT_FULL_UPDATE)
-
-    def wait_until_idle(self):
+    def send_sequence(self, records: tuple):
+        """
+        Replays a sequence compiled by compile_sequence(), one CS frame per
+        command
+        """
+        for command, data, wait in records:
+            self._send_record(command, data)
+            if wait:
+                self.wait_until_idle()
+
+    async def send_sequence_async(self, records: tuple):
+        for command, data, wait in records:
+            self._send_record(command, data)
+            if wait:
+                await self.wait_until_idle_async()
+
+    def _send_record(self, command, data):
+        self.dc.off()
+        self.cs.off()
+        self.spi.write(command)
+        if data is not None:
+            self.dc.on()
+            self.spi.write(data)
+        self.cs.on()
+
+    def init(self, reset_ms: int = RESET_DELAY_MS):
+        """
+        Cold start: resets the panel and sends its init sequence
+        """
+        self.reset(reset_ms)
+        self.wait_until_idle()
+        self._forget_state()
+        self.send_sequence(EPD._sequences[self.panel])
+        self._init_lut()
+
+    async def init_async(self, reset_ms: int = RESET_DELAY_MS):
+        await self.reset_async(reset_ms)
+        await self.wait_until_idle_async()
+        self._forget_state()
+        await self.send_sequence_async(EPD._sequences[self.panel])
+        self._init_lut()
+
+    def _forget_state(self):
+        # what a reset clears in the controller
+        self.asleep = False
+        self.lut = None
+        self.loaded_waveform = None
+
+    def _init_lut(self):
+        if self.panel == GDEH0154D27:
+            self.set_lut(self.LUT_FULL_UPDATE)
+
+    def wait_until_idle(self, timeout_ms: int = BUSY_TIMEOUT_MS):
+        """
+        Polls BUSY every BUSY_POLL_MS until it falls. The ESP32 cannot light
+        sleep until the edge, as BUSY is not an RTC GPIO.
+        :raises RuntimeError: if the panel is still busy after timeout_ms
+        """
+        start = ticks_ms()
         while self.busy.value() == BUSY:
-            sleep_ms(100)
+            if ticks_diff(ticks_ms(), start) > timeout_ms:
+                raise RuntimeError("EPD still busy after {} ms".format(timeout_ms))
+            sleep_ms(BUSY_POLL_MS)
+
+    async def wait_until_idle_async(self, timeout_ms: int = BUSY_TIMEOUT_MS):
+        """
+        Like wait_until_idle(), but lets other tasks run while the panel is
+        busy. The task sleeps until a pin interrupt on the falling edge of
+        BUSY sets a ThreadSafeFlag, or polls where uasyncio has none.
+        :raises RuntimeError: if the panel is still busy after timeout_ms
+        """
+        if self.busy.value() != BUSY:
+            return
+        start = ticks_ms()
+        ThreadSafeFlag = getattr(asyncio, "ThreadSafeFlag", None)
+        if ThreadSafeFlag is None:
+            while self.busy.value() == BUSY:
+                if ticks_diff(ticks_ms(), start) > timeout_ms:
+                    raise RuntimeError("EPD still busy after {} ms".format(timeout_ms))
+                await asyncio.sleep_ms(BUSY_POLL_MS)
+            return
+        flag = ThreadSafeFlag()  # a new one, so no edge of an earlier wait counts
+        self.busy.irq(trigger=self.busy.IRQ_FALLING, handler=lambda pin: flag.set())
+        try:
+            # BUSY is read again after each edge, as it may have risen since,
+            # and after the interrupt is set up, as it may have fallen before
+            while self.busy.value() == BUSY:
+                remaining = timeout_ms - ticks_diff(ticks_ms(), start)
+                if remaining <= 0:
+                    raise RuntimeError("EPD still busy after {} ms".format(timeout_ms))
+                try:
+                    await asyncio.wait_for_ms(flag.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.busy.irq(handler=None)
 
-    def reset(self):
+    def reset(self, delay_ms: int = RESET_DELAY_MS):
         self.rst.off()
-        sleep_ms(200)
+        sleep_ms(delay_ms)
         self.rst.on()
-        sleep_ms(200)
+        sleep_ms(delay_ms)
+
+    async def reset_async(self, delay_ms: int = RESET_DELAY_MS):
+        self.rst.off()
+        await asyncio.sleep_ms(delay_ms)
+        self.rst.on()
+        await asyncio.sleep_ms(delay_ms)
 
     def set_lut(self, lut):
-        self.send_command(WRITE_LUT_REGISTER, lut)
+        if lut is not self.lut:
+            self.send_command(WRITE_LUT_REGISTER, lut)
+            self.lut = lut
 
-    # to wake call reset() or init()
-    def sleep(self):
-        self.send_command(
-            DEEP_SLEEP_MODE
-        )  # enter deep sleep , b"\x01" A0=1, A0=0 power on
-        self.wait_until_idle()
+    def set_temperature(self, temperature: float | None, speed: int = SPEED_NORMAL):
+        """
+        Selects the waveform for the ambient temperature and speed class. It
+        is loaded before the next refresh, and only reloaded when the choice
+        or the display mode changes. With None, the controller measures the
+        temperature and loads the LUT on every refresh.
+        """
+        if temperature is None:
+            self.waveform = None
+            return
+        band = 0
+        while band < len(TEMPERATURE_BANDS) and temperature >= TEMPERATURE_BANDS[band]:
+            band += 1
+        waveforms = WAVEFORMS[band]
+        self.waveform = None if waveforms is None else waveforms[speed]
 
-    def hw_init(self):
-        self.wait_until_idle()
-        self.send_command(SW_RESET)
-        self.wait_until_idle()
+    def _start_load_waveform(self, partial: bool) -> bool:
+        """
+        :return: whether a load was started that has to be waited for
+        """
+        if self.panel == GDEH0154D27:
+            # no OTP waveforms: upload the RAM LUT for the mode
+            self.set_lut(self.LUT_PARTIAL_UPDATE if partial else self.LUT_FULL_UPDATE)
+            return False
+        if self.waveform is None or (self.waveform, partial) == self.loaded_waveform:
+            return False
+        self._send_params(TEMPERATURE_SENSOR_CONTROL, self.waveform, 0)
+        self._send_params(
+            DISPLAY_UPDATE_CONTROL_2, LOAD_LUT_PARTIAL if partial else LOAD_LUT_FULL
+        )
+        self.send_command(MASTER_ACTIVATION)
+        self.loaded_waveform = (self.waveform, partial)
+        return True
 
-        # init code
-        self.send_command(DRIVER_OUTPUT_CONTROL)
-        self.send_command(0xC7)
-        self.send_command(0x00)
-        self.send_command(0x00)
+    def load_waveform(self, partial=False):
+        if self._start_load_waveform(partial):
+            self.wait_until_idle()
 
-        self.send_command(DATA_ENTRY_MODE_SETTING)
-        self.send_command(DRIVER_OUTPUT_CONTROL)
+    def sleep(self, mode: int = DEEP_SLEEP_1):
+        """
+        Puts the controller into deep sleep once it is idle. Nothing but
+        wake() or init() may be sent until then, and BUSY reads busy.
+        :param mode: DEEP_SLEEP_1 keeps the RAM for the next partial refresh,
+        DEEP_SLEEP_2 draws the least current
+        """
+        self.wait_until_idle()
+        self._send_params(DEEP_SLEEP_MODE, mode)
+        self.asleep = True
 
-        self.send_command(SET_RAM_X_ADDRESS_START_END_POSITION)
-        self.send_command(0x00)
-        self.send_command(0x18)
+    def wake(self):
+        """
+        Wakes the controller from sleep() with a short hardware reset and
+        configures it again. The RAM content survives DEEP_SLEEP_1, the
+        loaded waveform does not.
+        """
+        self.init(WAKE_RESET_MS)
 
-        self.send_command(SET_RAM_Y_ADDRESS_START_END_POSITION)
-        self.send_command(0xC7)
-        self.send_command(0x00)
-        self.send_command(0x00)
-        self.send_command(0x00)
+    async def wake_async(self):
+        await self.init_async(WAKE_RESET_MS)
 
-        self.send_command(BORDER_WAVEFORM_CONTROL)
-        self.send_command(0x05)
+    def warm_init(self, loaded_waveform=None, asleep=False):
+        """
+        Takes over a panel that is still configured by init() from before
+        the MCU's deep sleep, without resetting it.
+        :param loaded_waveform: the loaded_waveform from before deep sleep
+        :param asleep: whether the panel was left in sleep(), in which case
+        it needs wake() before anything else
+        """
+        self.asleep = asleep
+        if asleep:
+            return  # BUSY stays high in deep sleep
+        self.wait_until_idle()
+        self.loaded_waveform = loaded_waveform
 
-        self.send_command(0x18)
-        self.send_command(0x80)
+    def set_window(self, x: int, y: int, w: int, h: int, mirror_y=False):
+        """
+        Sets the RAM window and address counters for a byte-aligned region
+        given in framebuffer coordinates. With mirror_y, the Y address counter
+        counts down from the bottom of the window, so rows can be sent in
+        framebuffer order and land Y-mirrored on the panel.
+        """
+        x_start = x // 8
+        x_end = (x + w - 1) // 8
+        if mirror_y:
+            mode = X_INC_Y_DEC
+            y_start = EPD_HEIGHT - 1 - y
+            y_end = EPD_HEIGHT - y - h
+        else:
+            mode = X_INC_Y_INC
+            y_start = y
+            y_end = y + h - 1
+        self._send_params(DATA_ENTRY_MODE_SETTING, mode)
+        self._send_params(SET_RAM_X_ADDRESS_START_END_POSITION, x_start, x_end)
+        self._send_params(
+            SET_RAM_Y_ADDRESS_START_END_POSITION,
+            y_start & 0xFF,
+            y_start >> 8,
+            y_end & 0xFF,
+            y_end >> 8,
+        )
+        self._send_params(SET_RAM_X_ADDRESS_COUNTER, x_start)
+        self._send_params(SET_RAM_Y_ADDRESS_COUNTER, y_start & 0xFF, y_start >> 8)
 
-        self.send_command(SET_RAM_X_ADDRESS_COUNTER)
-        self.send_command(0x00)
-        self.send_command(SET_RAM_Y_ADDRESS_COUNTER)
-        self.send_command(0x00)
-        self.wait_until_idle()
+    def start_update(self, partial=False):
+        """
+        Starts the refresh waveform without waiting for it to complete
+        """
+        if self.panel == GDEH0154D27:
+            sequence = UPDATE_RAM_LUT
+        elif self.waveform is None:
+            sequence = UPDATE_PARTIAL if partial else UPDATE_FULL
+        else:
+            sequence = UPDATE_PARTIAL_LOADED if partial else UPDATE_FULL_LOADED
+        self._send_params(DISPLAY_UPDATE_CONTROL_2, sequence)
+        self.send_command(MASTER_ACTIVATION)
+        if self.panel == GDEH0154D27:
+            self.send_command(TERMINATE_FRAME_READ_WRITE)
 
     def update(self, partial=False):
-        data = bytearray([0xFF if partial else 0xF7])
-        self.send_command(DISPLAY_UPDATE_CONTROL_2, data)
-        self.send_command(MASTER_ACTIVATION)
+        self.start_update(partial)
         self.wait_until_idle()
 
+    async def update_async(self, partial=False):
+        self.start_update(partial)
+        await self.wait_until_idle_async()
+
     def write_buffer_to_ram(
         self,
         buffer: bytearray,
@@ -179,6 +478,8 @@ class EPD:
     ):
         """
         Adapted from https://github.com/ZinggJM/GxEPD2
+
+        The window is streamed as a single data frame, see _write_rows().
         """
         width_bytes: int = (w + 7) // 8  # width bytes, bitmaps are padded
         x -= x % 8  # byte boundary
@@ -191,16 +492,136 @@ class EPD:
         dy: int = y1 - y
         w1 -= dx
         h1 -= dy
-        for i in range(h1):
-            for j in range(w1 // 8):
-                idx: int = (
-                    j + dx // 8 + ((h - 1 - (i + dy))) * width_bytes
-                    if mirror_y
-                    else j + dx // 8 + (i + dy) * width_bytes
-                )
-                self.send_data(bytearray([~buffer[idx] if invert else buffer[idx]]))
+        row_bytes: int = w1 // 8
+        if row_bytes <= 0 or h1 <= 0:
+            return
+        first: int = dx // 8
+        if mirror_y:
+            start: int = first + (h - 1 - dy) * width_bytes
+            self._write_rows(buffer, start, -width_bytes, row_bytes, h1, invert)
+        else:
+            start = first + dy * width_bytes
+            self._write_rows(buffer, start, width_bytes, row_bytes, h1, invert)
 
-    def display_buffer(self, buffer: bytearray, mirror_y=True, partial=False):
-        self.send_command(WRITE_RAM)
-        self.write_buffer_to_ram(buffer, mirror_y=True)
+    def _write_rows(
+        self,
+        buffer: bytearray,
+        start: int,
+        stride: int,
+        row_bytes: int,
+        rows: int,
+        invert=False,
+    ):
+        """
+        Streams `rows` rows of `row_bytes` bytes as a single data frame (DC
+        high, CS low), the first at `start` in `buffer` and each next one
+        `stride` bytes further, so a negative stride sends them bottom-up.
+        Memoryview slices of `buffer` avoid per-byte allocation, and rows that
+        are contiguous in `buffer` go out in a single spi.write().
+        """
+        mv = memoryview(buffer)
+        self.dc.on()
+        self.cs.off()
+        if stride == row_bytes and not invert:
+            self.spi.write(mv[start : start + rows * row_bytes])
+        elif invert:
+            row = memoryview(self._row_buffer)[:row_bytes]
+            for _ in range(rows):
+                for j in range(row_bytes):
+                    row[j] = 0xFF ^ buffer[start + j]
+                self.spi.write(row)
+                start += stride
+        else:
+            for _ in range(rows):
+                self.spi.write(mv[start : start + row_bytes])
+                start += stride
+        self.cs.on()
+
+    def write_window(
+        self,
+        buffer: bytearray,
+        x: int,
+        y: int,
+        w: int,
+        h: int,
+        mirror_y=True,
+        command: int = WRITE_RAM,
+    ):
+        """
+        Writes the window (x, y, w, h) of a full-screen framebuffer into the
+        panel RAM selected by `command`: WRITE_RAM for the new image or
+        WRITE_RAM_RED for the old image that partial refreshes compare against.
+        The window is widened to byte boundaries.
+        """
+        x, y, w, h = align_window(x, y, w, h)
+        if w == 0 or h == 0:
+            return
+        hw_mirror_y = mirror_y and self.hw_mirror_y
+        if mirror_y and not hw_mirror_y:
+            # panel rows run bottom-up: send the framebuffer rows reversed
+            self.set_window(x, EPD_HEIGHT - y - h, w, h)
+            row, stride = y + h - 1, -WIDTH_BYTES
+        else:
+            self.set_window(x, y, w, h, mirror_y=hw_mirror_y)
+            row, stride = y, WIDTH_BYTES
+        self.send_command(command)
+        self._write_rows(buffer, row * WIDTH_BYTES + x // 8, stride, w // 8, h)
+
+    def _write_windows(self, buffer: bytearray, windows, mirror_y):
+        for x, y, w, h in windows:
+            self.write_window(buffer, x, y, w, h, mirror_y)
+
+    def write_old_image(self, buffer: bytearray, windows, mirror_y=True):
+        """
+        Keeps the old image in step with the glass for the next partial
+        refresh. Only valid once the refresh of `buffer` has completed.
+        """
+        if self.panel == GDEH0154D27:
+            return  # single RAM, partial refreshes are driven by the LUT
+        for x, y, w, h in windows:
+            self.write_window(buffer, x, y, w, h, mirror_y, WRITE_RAM_RED)
+
+    def display_windows(
+        self, buffer: bytearray, windows, mirror_y=True, partial=True, wait=True
+    ):
+        """
+        Writes each (x, y, w, h) window of a full-screen framebuffer into the
+        panel RAM and then refreshes the panel once. Everything outside the
+        windows keeps what is already in the panel RAM.
+        :param wait: with False, returns as soon as the refresh has started;
+        the panel finishes it on its own, and write_old_image() has to follow
+        once it is idle
+        """
+        self.load_waveform(partial)
+        self._write_windows(buffer, windows, mirror_y)
+        if not wait:
+            self.start_update(partial)
+            return
         self.update(partial)
+        self.write_old_image(buffer, windows, mirror_y)
+
+    async def display_windows_async(
+        self, buffer: bytearray, windows, mirror_y=True, partial=True
+    ):
+        if self._start_load_waveform(partial):
+            await self.wait_until_idle_async()
+        self._write_windows(buffer, windows, mirror_y)
+        await self.update_async(partial)
+        self.write_old_image(buffer, windows, mirror_y)
+
+    def display_window(
+        self, buffer: bytearray, x: int, y: int, w: int, h: int, mirror_y=True
+    ):
+        """
+        Partially refreshes the window (x, y, w, h) of a full-screen
+        framebuffer, sending only that window's bytes.
+        """
+        self.display_windows(buffer, ((x, y, w, h),), mirror_y)
+
+    def display_buffer(self, buffer: bytearray, mirror_y=True, partial=False):
+        self.display_windows(buffer, FULL_WINDOW, mirror_y, partial)
+
+    async def display_buffer_async(
+        self, buffer: bytearray, mirror_y=True, partial=False
+    ):
+        await self.display_windows_async(buffer, FULL_WINDOW, mirror_y, partial)
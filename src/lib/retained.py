@@ -0,0 +1,259 @@
+"""
+State retained across machine.deepsleep().
+
+The record lives in the RTC slow memory, which survives deep sleep but not a
+power loss. It holds the e-paper panel state, the refresh counters and the
+last displayed frame, which is stored run-length encoded after the header
+when it fits, otherwise raw in a flash file. The header and the frame are
+checked against a magic number, version and CRC32s, so a missing or corrupt
+record simply reads back as "nothing retained".
+"""
+
+from binascii import crc32
+from machine import RTC
+from micropython import const
+import micropython
+import ustruct
+
+MAGIC = const(0x5759)
+VERSION = const(6)
+RTC_MEMORY_SIZE = const(2048)  # MicroPython's limit on the ESP32
+FRAME_PATH = "/frame.bin"
+
+# magic, version, frame location, frame crc32, encoded frame length,
+# partial refreshes since the last full one, time of the last full refresh,
+# panel configured, loaded waveform, refresh left running on the panel, the
+# number of windows it covers and their (x, y, w, h) bytes, panel deep sleep
+# mode, crc32 of everything before it
+HEADER = "<HBBIHHIBBBB16sBI"
+HEADER_SIZE = const(41)
+HEADER_CRC_OFFSET = const(37)
+MAX_PENDING_WINDOWS = const(4)
+
+FRAME_NONE = const(0)
+FRAME_RTC = const(1)  # run-length encoded, right after the header
+FRAME_FILE = const(2)  # raw, in FRAME_PATH
+
+NO_WAVEFORM = const(0xFF)
+PARTIAL_WAVEFORM = const(0x80)  # flag on the waveform's temperature
+
+
+@micropython.native
+def rle_encode(src, dst):
+    """
+    PackBits-style encoding: a control byte c < 128 is followed by c + 1
+    literal bytes, c >= 128 is followed by one byte repeated c - 125 times.
+    :return: the encoded length, or -1 if it does not fit in dst
+    """
+    mv = memoryview(src)
+    n = len(src)
+    limit = len(dst)
+    i = 0
+    o = 0
+    while i < n:
+        b = src[i]
+        j = i + 1
+        while j < n and j - i < 130 and src[j] == b:
+            j += 1
+        if j - i >= 3:
+            if o + 2 > limit:
+                return -1
+            dst[o] = j - i + 125
+            dst[o + 1] = b
+            o += 2
+            i = j
+            continue
+        start = i
+        while i < n and i - start < 128:
+            if i + 2 < n and src[i] == src[i + 1] and src[i] == src[i + 2]:
+                break
+            i += 1
+        count = i - start
+        if o + 1 + count > limit:
+            return -1
+        dst[o] = count - 1
+        dst[o + 1 : o + 1 + count] = mv[start:i]
+        o += 1 + count
+    return o
+
+
+@micropython.native
+def rle_decode(src, dst):
+    """
+    :return: whether src decoded to exactly len(dst) bytes
+    """
+    n = len(src)
+    limit = len(dst)
+    i = 0
+    o = 0
+    while i < n:
+        c = src[i]
+        i += 1
+        if c >= 128:
+            count = c - 125
+            if i >= n or o + count > limit:
+                return False
+            b = src[i]
+            i += 1
+            for k in range(o, o + count):
+                dst[k] = b
+        else:
+            count = c + 1
+            if i + count > n or o + count > limit:
+                return False
+            dst[o : o + count] = src[i : i + count]
+            i += count
+        o += count
+    return o == limit
+
+
+class RetainedState:
+    def __init__(self):
+        self.rtc = RTC()
+        self.partial_count = 0
+        self.last_full_time = 0
+        # whether the panel still holds the configuration from EPD.init()
+        self.panel_ready = False
+        self.waveform = None  # EPD.loaded_waveform
+        # a refresh was started without waiting for it before deep sleep
+        self.refresh_pending = False
+        # (x, y, w, h) windows of that refresh, each at most 255
+        self.pending_windows: list = []
+        self.sleep_mode = 0  # EPD.sleep() mode the panel is in, 0 when awake
+        self._location = FRAME_NONE
+        self._frame_crc = 0
+        self._length = 0
+
+    def load(self, frame: bytearray) -> bool:
+        """
+        Reads the retained state, and the retained frame into `frame`.
+        :return: False if there is no valid frame, in which case the contents
+        of `frame` are undefined
+        """
+        data = memoryview(self.rtc.memory())
+        if len(data) < HEADER_SIZE:
+            return False
+        (
+            magic,
+            version,
+            location,
+            frame_crc,
+            length,
+            partial_count,
+            last_full_time,
+            panel_ready,
+            waveform,
+            refresh_pending,
+            window_count,
+            windows,
+            sleep_mode,
+            header_crc,
+        ) = ustruct.unpack_from(HEADER, data)
+        if (
+            magic != MAGIC
+            or version != VERSION
+            or crc32(data[:HEADER_CRC_OFFSET]) != header_crc
+        ):
+            return False
+        self.partial_count = partial_count
+        self.last_full_time = last_full_time
+        self.panel_ready = bool(panel_ready)
+        self.refresh_pending = bool(refresh_pending)
+        self.pending_windows = [
+            tuple(windows[i * 4 : i * 4 + 4])
+            for i in range(min(window_count, MAX_PENDING_WINDOWS))
+        ]
+        self.sleep_mode = sleep_mode
+        self.waveform = (
+            None
+            if waveform == NO_WAVEFORM
+            else (waveform & ~PARTIAL_WAVEFORM, bool(waveform & PARTIAL_WAVEFORM))
+        )
+        if location == FRAME_RTC:
+            if not rle_decode(data[HEADER_SIZE : HEADER_SIZE + length], frame):
+                return False
+        elif location == FRAME_FILE:
+            try:
+                with open(FRAME_PATH, "rb") as f:
+                    if f.readinto(frame) != len(frame):
+                        return False
+            except OSError:
+                return False
+        else:
+            return False
+        if crc32(frame) != frame_crc:
+            return False
+        self._location = location
+        self._frame_crc = frame_crc
+        self._length = length
+        return True
+
+    def save(self, frame: bytearray | None):
+        """
+        Retains the state and `frame`, or forgets the retained frame if it is
+        None
+        """
+        record = bytearray(RTC_MEMORY_SIZE)
+        self._location = FRAME_NONE
+        self._frame_crc = 0
+        self._length = 0
+        if frame is not None:
+            length = rle_encode(frame, memoryview(record)[HEADER_SIZE:])
+            if length < 0:
+                # never leave a valid header pointing at a half-written file
+                self._write(record)
+                try:
+                    with open(FRAME_PATH, "wb") as f:
+                        f.write(frame)
+                    self._location = FRAME_FILE
+                except OSError:
+                    pass
+            else:
+                self._location = FRAME_RTC
+                self._length = length
+            if self._location != FRAME_NONE:
+                self._frame_crc = crc32(frame)
+        self._write(record)
+
+    def save_state(self):
+        """
+        Retains the state, keeping the retained frame as it is
+        """
+        record = bytearray(self.rtc.memory())
+        if len(record) < HEADER_SIZE + self._length:
+            record = bytearray(HEADER_SIZE)
+            self._location = FRAME_NONE
+            self._length = 0
+        self._write(record)
+
+    def _write(self, record: bytearray):
+        if self.waveform is None:
+            waveform = NO_WAVEFORM
+        else:
+            temperature, partial = self.waveform
+            waveform = temperature | (PARTIAL_WAVEFORM if partial else 0)
+        windows = bytearray(MAX_PENDING_WINDOWS * 4)
+        for i, window in enumerate(self.pending_windows[:MAX_PENDING_WINDOWS]):
+            windows[i * 4 : i * 4 + 4] = bytes(window)
+        ustruct.pack_into(
+            HEADER,
+            record,
+            0,
+            MAGIC,
+            VERSION,
+            self._location,
+            self._frame_crc,
+            self._length,
+            self.partial_count,
+            self.last_full_time,
+            self.panel_ready,
+            waveform,
+            self.refresh_pending,
+            min(len(self.pending_windows), MAX_PENDING_WINDOWS),
+            windows,
+            self.sleep_mode,
+            0,
+        )
+        crc = crc32(memoryview(record)[:HEADER_CRC_OFFSET])
+        ustruct.pack_into("<I", record, HEADER_CRC_OFFSET, crc)
+        self.rtc.memory(memoryview(record)[: HEADER_SIZE + self._length])
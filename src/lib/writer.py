@@ -27,6 +27,7 @@
 import framebuf
 from uctypes import bytearray_at, addressof
 from sys import implementation
+import micropython
 import os
 
 __version__ = (0, 5, 0)
@@ -34,6 +35,54 @@ __version__ = (0, 5, 0)
 fast_mode = True  # Does nothing. Kept to avoid breaking code.
 
 
+@micropython.native
+def _invert(buf, n: int):
+    for i in range(n):
+        buf[i] ^= 0xFF
+
+
+@micropython.native
+def _copy_rows(
+    dst,
+    dpos: int,
+    dstride: int,
+    src,
+    spos: int,
+    sstride: int,
+    clip: int,
+    rows: int,
+    flip: int,
+):
+    # Copies the first `clip` pixels of `rows` MONO_HLSB rows from src to
+    # dst, XOR-ing the bytes with flip, without touching the pixels of dst
+    # past them
+    whole = clip >> 3
+    mask = (0xFF00 >> (clip & 7)) & 0xFF  # pixels taken from the last byte
+    keep = mask ^ 0xFF
+    for _ in range(rows):
+        for i in range(whole):
+            dst[dpos + i] = src[spos + i] ^ flip
+        if mask:
+            i = dpos + whole
+            dst[i] = (dst[i] & keep) | ((src[spos + whole] ^ flip) & mask)
+        dpos += dstride
+        spos += sstride
+
+
+# blit() palette mapping glyph pixels to colours, see Writer._printchar
+_PALETTE_INVERT = bytearray(b"\x80")  # 0 -> 1, 1 -> 0
+
+
+def _has_blit_palette():
+    # blit() takes a palette since MicroPython 1.19
+    fb = framebuf.FrameBuffer(bytearray(1), 2, 1, framebuf.MONO_HLSB)
+    try:
+        fb.blit(fb, 0, 0, -1, fb)
+    except TypeError:
+        return False
+    return True
+
+
 class DisplayState:
     def __init__(self):
         self.text_row = 0
@@ -76,6 +125,7 @@ class Writer:
         bg_color: int = 1,
         fg_color: int = 0,
         verbose=True,
+        buffer=None,
     ):
         self.devid = _get_id(device)
         self.device = device
@@ -107,11 +157,43 @@ class Writer:
         self.cpos = 0
         self.tab = 4
 
+        # Glyph metrics table emitted by newer font_to_py, else bitmaps are
+        # scanned for them
+        self.metrics = getattr(font, "metrics", None)
+        # Fonts from font_to_py --compress hold runs of lit pixels instead of
+        # bitmaps, and always come with metrics
+        self.compressed = hasattr(font, "compressed") and font.compressed()
+        # Fonts from font_to_py --inverted store lit pixels as 0 bits, so
+        # printing them inverted (black on white) needs no inversion at all
+        self.inverted = hasattr(font, "inverted") and font.inverted()
+        # The bytearray behind a MONO_HLSB device: glyphs starting on a byte
+        # boundary are copied into it row by row instead of being blitted
+        self.buffer = None if font.reverse() or self.compressed else buffer
+        # Fonts from newer font_to_py locate glyphs by offset into a single
+        # memoryview, so hot loops can read them without allocating
+        self.glyph_offset = getattr(font, "glyph_offset", None)
+        self.font_data = None if self.glyph_offset is None else font.font_data()
+
         self.glyph = None  # Current char
         self.char_height = 0
         self.char_width = 0
         self.clip_width = 0
 
+        # Glyphs are blitted straight from the font data, inverted through a
+        # palette when needed. Without palette support those are copied to a
+        # scratch buffer and inverted there. Compressed glyphs are drawn
+        # directly.
+        self.palette = None
+        self.scratch = None
+        if self.compressed:
+            pass
+        elif _has_blit_palette():
+            self.palette = framebuf.FrameBuffer(
+                _PALETTE_INVERT, 2, 1, framebuf.MONO_HLSB
+            )
+        else:
+            self.scratch = bytearray(((font.max_width() - 1) // 8 + 1) * font.height())
+
     def _getstate(self):
         return Writer.state[self.devid]
 
@@ -152,63 +234,141 @@ class Writer:
                 self._printchar("\n")
 
     def _printline(self, string, invert):
-        rstr = None
-        if self.wrap and self.stringlen(string, True):  # Length > self.screenwidth
-            pos = 0
-            lstr = string[:]
-            while self.stringlen(lstr, True):  # Length > self.screenwidth
-                pos = lstr.rfind(" ")
-                lstr = lstr[:pos].rstrip()
-            if pos > 0:
-                rstr = string[pos + 1 :]
-                string = lstr
-
-        for char in string:
-            self._printchar(char, invert)
-        if rstr is not None:
-            self._printchar("\n")
-            self._printline(rstr, invert)  # Recurse
+        if not self.wrap:
+            for char in string:
+                self._printchar(char, invert)
+            return
+        for n, (start, end) in enumerate(self.wrap_lines(string)):
+            if n:
+                self._printchar("\n")
+            for i in range(start, end):
+                self._printchar(string[i], invert)
+
+    def wrap_lines(self, string, col=None):
+        """
+        Word wrapping in a single pass over the glyph advances, without
+        printing anything. Lines break at spaces, which are dropped, and a
+        word wider than the screen gets a line of its own.
+        :param col: column the text starts at, by default the current one
+        :return: list of (start, end) slices of `string`, one per line
+        """
+        if col is None:
+            col = self._getstate().text_col
+        width = self.screenwidth - col
+        space = self.font.get_ch(" ")[2]
+        lines = []
+        start = 0  # of the current line
+        brk = -1  # end of the last word on the current line
+        used = 0  # advance of the current line up to brk
+        n = len(string)
+        pos = 0
+        while pos < n:
+            end = string.find(" ", pos)
+            if end < 0:
+                end = n
+            if end > pos:  # a word
+                advance, before = self._measure(string, pos, end)
+                gap = (pos - (start if brk < 0 else brk)) * space
+                # the ink never runs past the advance, so it is only measured
+                # when the advance overflows
+                if (
+                    brk >= 0
+                    and used + gap + advance > width
+                    and used + gap + before + self._truelen(string[end - 1]) > width
+                ):
+                    lines.append((start, brk))
+                    start = brk + 1
+                    width = self.screenwidth
+                    brk = -1
+                    used = 0
+                    gap = (pos - start) * space
+                used += gap + advance
+                brk = end
+            pos = end + 1
+        lines.append((start, n))
+        return lines
+
+    def _measure(self, string, start, end):
+        # advance of string[start:end], and its advance up to the last glyph,
+        # to which _truelen() of that glyph adds up to the width of the ink
+        get_ch = self.font.get_ch
+        offset = self.glyph_offset
+        data = self.font_data
+        advance = 0
+        before = 0  # advance up to the last glyph
+        for i in range(start, end):
+            before = advance
+            if offset is None:
+                advance += get_ch(string[i])[2]
+            else:
+                doff = offset(ord(string[i]))
+                advance += data[doff] | (data[doff + 1] << 8)
+        return advance, before
 
     def stringlen(self, string, oh=False):
         if not len(string):
             return 0
-        sc = self._getstate().text_col  # Start column
-        wd = self.screenwidth
-        l = 0
-        for char in string[:-1]:
-            _, _, char_width = self.font.get_ch(char)
-            l += char_width
-            if oh and l + sc > wd:
-                return True  # All done. Save time.
-        char = string[-1]
-        _, _, char_width = self.font.get_ch(char)
-        if oh and l + sc + char_width > wd:
-            l += self._truelen(char)  # Last char might have blank cols on RHS
-        else:
-            l += char_width  # Public method. Return same value as old code.
-        return l + sc > wd if oh else l
+        advance, before = self._measure(string, 0, len(string))
+        if not oh:
+            return advance
+        # Overhang: whether the ink runs past the right edge
+        sc = self._getstate().text_col
+        if advance + sc <= self.screenwidth:
+            return False
+        return before + self._truelen(string[-1]) + sc > self.screenwidth
+
+    def glyph_metrics(self, char):
+        """
+        :return: (advance, ink width, left bearing, top row, bottom row) of
+        the glyph in pixels, the rows bounding its lit pixels (bottom
+        exclusive). All but the advance are 0 for a blank glyph.
+        """
+        if self.metrics is not None:
+            return tuple(self.metrics(char))
+        glyph, ht, wd = self.font.get_ch(char)
+        gbytes = (wd - 1) // 8 + 1
+        left, right, top, bottom = wd, 0, ht, 0
+        unlit = 0x80 if self.inverted else 0
+        for row in range(ht):
+            for col in range(wd):
+                bit = glyph[row * gbytes + col // 8] << (col % 8) & 0x80
+                if bit != unlit:
+                    left = min(left, col)
+                    right = max(right, col + 1)
+                    top = min(top, row)
+                    bottom = row + 1
+        if not right:
+            return wd, 0, 0, 0, 0
+        return wd, right - left, left, top, bottom
 
     # Return the printable width of a glyph less any blank columns on RHS
     def _truelen(self, char):
+        if self.metrics is not None:
+            m = self.metrics(char)
+            return m[1] + m[2] if m[1] else 1  # 1 for a blank glyph
         glyph, ht, wd = self.font.get_ch(char)
-        div, mod = divmod(wd, 8)
-        gbytes = div + 1 if mod else div  # No. of bytes per row of glyph
-        mc = 0  # Max non-blank column
-        data = glyph[(wd - 1) // 8]  # Last byte of row 0
-        for row in range(ht):  # Glyph row
-            for col in range(wd - 1, -1, -1):  # Glyph column
-                gbyte, gbit = divmod(col, 8)
-                if gbit == 0:  # Next glyph byte
-                    data = glyph[row * gbytes + gbyte]
-                if col <= mc:
+        gbytes = (wd - 1) // 8 + 1
+        xor = 0xFF if self.inverted else 0
+        pad = (0xFF << (gbytes * 8 - wd)) & 0xFF  # lit bits of the last byte
+        mc = 0  # columns up to the rightmost lit one found so far
+        for row in range(ht):
+            pos = row * gbytes
+            # right to left, only through the bytes that could raise mc
+            for gbyte in range(gbytes - 1, (mc >> 3) - 1, -1):
+                data = glyph[pos + gbyte] ^ xor
+                if gbyte == gbytes - 1:
+                    data &= pad
+                if data:
+                    col = gbyte * 8 + 8
+                    while not data & 1:
+                        data >>= 1
+                        col -= 1
+                    if col > mc:
+                        mc = col
                     break
-                if data & (1 << (7 - gbit)):  # Pixel is lit (1)
-                    mc = col  # Eventually gives rightmost lit pixel
-                    break
-            if mc + 1 == wd:
+            if mc == wd:
                 break  # All done: no trailing space
-        # print('Truelen', char, wd, mc + 1)  # TEST
-        return mc + 1
+        return mc if mc else 1
 
     def _get_char(self, char, recurse):
         if not recurse:  # Handle tabs
@@ -255,15 +415,145 @@ class Writer:
         self._get_char(char, recurse)
         if self.glyph is None:
             return  # All done
-        buf = bytearray(self.glyph)
-        if invert:
-            for i, v in enumerate(buf):
-                buf[i] = 0xFF & ~v
-        fbc = framebuf.FrameBuffer(buf, self.clip_width, self.char_height, self.map)
-        self.device.blit(fbc, s.text_col, s.text_row)
+        self._draw_glyph(
+            self.glyph,
+            s.text_col,
+            s.text_row,
+            self.char_width,
+            self.clip_width,
+            self.char_height,
+            invert,
+        )
         s.text_col += self.char_width
         self.cpos += 1
 
+    def render_run(self, text, x, y, invert=True):
+        """
+        Draws `text` on a single line, with less overhead per glyph than
+        printstring(): glyphs are fetched and placed in one pass with the
+        state in locals. Tabs and newlines are not interpreted and nothing
+        wraps or scrolls, glyphs past the right edge are clipped. The text
+        position is left after the run.
+        :return: the column after the last glyph drawn
+        :raises ValueError: if the line does not fit on the screen
+        """
+        height = self.font.height()
+        if not 0 <= x < self.screenwidth or y < 0 or y + height > self.screenheight:
+            raise ValueError("run is out of range")
+        get_ch = self.font.get_ch
+        draw = self._draw_glyph
+        blit = self.device.blit
+        FrameBuffer = framebuf.FrameBuffer
+        fmap = self.map
+        buffer = self.buffer
+        width = self.screenwidth
+        stride = width >> 3
+        flip = invert != self.inverted
+        xor = 0xFF if flip else 0
+        palette = self.palette if flip else None
+        # compressed glyphs and inversion in a scratch buffer take the
+        # general path
+        general = self.compressed or (flip and palette is None)
+        # glyphs read by offset from the font data, see glyph_offset
+        offset = None if general else self.glyph_offset
+        data = self.font_data
+        col = x
+        for char in text:
+            if col >= width:
+                break
+            if offset is None:
+                glyph, _, advance = get_ch(char)
+                spos = 0
+            else:
+                glyph = data
+                spos = offset(ord(char))
+                advance = data[spos] | (data[spos + 1] << 8)
+                spos += 2
+            clip = min(advance, width - col)
+            gstride = (advance - 1) // 8 + 1
+            if general:
+                draw(glyph, col, y, advance, clip, height, invert)
+            elif buffer is not None and not col & 7:
+                pos = y * stride + (col >> 3)
+                _copy_rows(buffer, pos, stride, glyph, spos, gstride, clip, height, xor)
+            else:
+                if offset is not None:
+                    glyph = data[spos : spos + gstride * height]
+                buf = bytearray_at(addressof(glyph), len(glyph))  # no copy
+                fbc = FrameBuffer(buf, clip, height, fmap, advance)
+                if palette is None:
+                    blit(fbc, col, y)
+                else:
+                    blit(fbc, col, y, -1, palette)
+            col += advance
+        s = self._getstate()
+        s.text_row = y
+        s.text_col = col
+        self.cpos += len(text)
+        return col
+
+    def _draw_glyph(self, glyph, x, y, width, clip, height, invert):
+        # Draws the first `clip` columns of a glyph `width` pixels wide
+        flip = invert != self.inverted
+        if self.compressed:
+            self._draw_runs(glyph, x, y, clip, height, invert)
+        elif self.buffer is not None and not x & 7:
+            stride = self.screenwidth >> 3
+            _copy_rows(
+                self.buffer,
+                y * stride + (x >> 3),
+                stride,
+                glyph,
+                0,
+                (width - 1) // 8 + 1,
+                clip,
+                height,
+                0xFF if flip else 0,
+            )
+        else:
+            if flip and self.palette is None:
+                buf = self.scratch
+                buf[: len(glyph)] = glyph
+                _invert(buf, len(glyph))
+            else:
+                buf = bytearray_at(addressof(glyph), len(glyph))  # no copy
+            fbc = framebuf.FrameBuffer(buf, clip, height, self.map, width)
+            if flip and self.palette is not None:
+                self.device.blit(fbc, x, y, -1, self.palette)
+            else:
+                self.device.blit(fbc, x, y)
+
+    @micropython.native
+    def _draw_runs(self, glyph, x: int, y: int, clip: int, height: int, invert):
+        # Decodes a compressed glyph straight into the device, a group of
+        # rows at a time: the glyph box is cleared, then each run of lit
+        # pixels is drawn as a rectangle as tall as its group. See
+        # Font.compress_char() in font_to_py for the layout.
+        fg = 0 if invert else 1
+        device = self.device
+        device.fill_rect(x, y, clip, height, 1 - fg)
+        row = y + glyph[0]
+        i = 2
+        for _ in range(glyph[1]):
+            rows = glyph[i]
+            runs = glyph[i + 1]
+            i += 2
+            col = 0
+            for _ in range(runs):
+                run = glyph[i]
+                if run:
+                    col += run >> 4
+                    length = run & 0x0F
+                    i += 1
+                else:
+                    col += glyph[i + 1]
+                    length = glyph[i + 2]
+                    i += 3
+                if col < clip:
+                    device.fill_rect(x + col, row, min(length, clip - col), rows, fg)
+                col += length
+            row += rows
+
     def tabsize(self, value=None):
         if value is not None:
             self.tab = value
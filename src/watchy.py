@@ -31,6 +31,9 @@ import assets.fonts.fira_sans_regular_28 as fira_sans_regular_28
 
 
 DEBUG = False
+# left edge of the watchface text, on a byte boundary so that the first glyph
+# of each line is copied straight into the display buffer
+MARGIN = 8
 
 
 class Watchy:
@@ -43,12 +46,14 @@ class Watchy:
         i2c = SoftI2C(sda=Pin(RTC_SDA_PIN), scl=Pin(RTC_SCL_PIN))
         self.rtc = DS3231(i2c)
         self.rtc.alarm1(time=(0), match=self.rtc.AL1_EVERY_S, int_en=True)
+        self.display.set_temperature(self.rtc.temperature())
         self.adc = ADC(Pin(BATT_ADC_PIN, Pin.IN))
 
         self.init_interrupts()
         # self.init_buttons()
         self.handle_wakeup()
         if not DEBUG:
+            self.display.hold_pins()
             machine.deepsleep()
 
     def init_interrupts(self):
@@ -101,11 +106,11 @@ class Watchy:
         datetime = self.rtc.datetime()
         (_, month, day, week_day, hours, minutes, _, _) = datetime
         self.display.display_text(
-            hour_to_string(hours), 10, 15, fira_sans_bold_58, WHITE, BLACK
+            hour_to_string(hours), MARGIN, 15, fira_sans_bold_58, WHITE, BLACK
         )
 
         display_minutes_1 = lambda text: self.display.display_text(
-            text, 10, 80, fira_sans_regular_38, WHITE, BLACK
+            text, MARGIN, 80, fira_sans_regular_38, WHITE, BLACK
         )
         if minutes == 0:
             display_minutes_1("o'clock")
@@ -117,19 +122,20 @@ class Watchy:
             minutes_tens_str, minutes_ones_str = number_tens_to_string(minutes)
             display_minutes_1(minutes_tens_str)
             self.display.display_text(
-                minutes_ones_str, 10, 115, fira_sans_regular_38, WHITE, BLACK
+                minutes_ones_str, MARGIN, 115, fira_sans_regular_38, WHITE, BLACK
             )
         week_day_str = week_day_to_short_string(week_day)
         month_str = month_to_short_string(month)
         self.display.display_text(
             f"{week_day_str}, {day} {month_str}",
-            10,
+            MARGIN,
             160,
             fira_sans_regular_28,
             WHITE,
             BLACK,
         )
-        self.display.update()
+        # the panel finishes the refresh while the MCU is in deep sleep
+        self.display.update(wait=DEBUG)
 
     def get_battery_voltage(self) -> float:
         return self.adc.read_uv() / 1000 * 2